@@ -0,0 +1,21 @@
+function gq_all = getAllGlobalQuantities(obj)
+    % getAllGlobalQuantities - Get every global quantity field in a single call
+    %
+    % Batches getGlobalQuantity over expt(1).globalQuantity so callers going
+    % through the MATLAB engine pay one round-trip instead of one per field.
+    %
+    % Returns:
+    %   gq_all - 1 x N cell array of getGlobalQuantity structs
+    %            (empty cell if no experiment is loaded)
+    
+    if isempty(obj.eset) || isempty(obj.eset.expt)
+        gq_all = {};
+        return;
+    end
+    
+    num_gq = length(obj.eset.expt(1).globalQuantity);
+    gq_all = cell(1, num_gq);
+    for i = 1:num_gq
+        gq_all{i} = obj.getGlobalQuantity(i);
+    end
+end
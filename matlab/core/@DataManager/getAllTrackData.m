@@ -0,0 +1,29 @@
+function tracks_export = getAllTrackData(obj, first_id, last_id)
+    % getAllTrackData - Export a range of tracks in a single call
+    %
+    % Batches getCompleteTrackData so callers going through the MATLAB
+    % engine pay one round-trip per range instead of one per track.
+    %
+    % Inputs:
+    %   first_id - First track ID (1-indexed, default 1)
+    %   last_id  - Last track ID, inclusive (default: number of tracks)
+    %
+    % Returns:
+    %   tracks_export - 1 x N cell array of getCompleteTrackData structs
+    %
+    % Usage:
+    %   batch = app.getAllTrackData(1, 50);
+    
+    if nargin < 2 || isempty(first_id)
+        first_id = 1;
+    end
+    if nargin < 3 || isempty(last_id)
+        last_id = length(obj.tracks);
+    end
+    
+    track_ids = first_id:last_id;
+    tracks_export = cell(1, length(track_ids));
+    for i = 1:length(track_ids)
+        tracks_export{i} = obj.getCompleteTrackData(track_ids(i));
+    end
+end
@@ -37,15 +37,15 @@ function track_export = getCompleteTrackData(obj, track_id)
     % === LOGICAL/STATE ARRAYS ===
     track_export.state = struct();
     
-    if ~isempty(track.headSwing) && length(track.headSwing) > 0
+    if ~isempty(track.headSwing)
         track_export.state.headSwing = track.headSwing;
     end
     
-    if ~isempty(track.isrun) && length(track.isrun) > 0
+    if ~isempty(track.isrun)
         track_export.state.isrun = track.isrun;
     end
     
-    if ~isempty(track.iscollision) && length(track.iscollision) > 0
+    if ~isempty(track.iscollision)
         track_export.state.iscollision = track.iscollision;
     end
     
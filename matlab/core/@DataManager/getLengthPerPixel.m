@@ -0,0 +1,19 @@
+function lengthPerPixel = getLengthPerPixel(obj)
+    % getLengthPerPixel - Camera calibration scale (cm per pixel) of expt(1)
+    %
+    % Maps two test pixels through camcalinfo.c2rX/c2rY and divides the real
+    % distance by the pixel distance (same method as the validation scripts).
+    % Returned directly so engine callers need a single eval.
+    %
+    % Returns:
+    %   lengthPerPixel - Scalar cm/pixel
+    
+    cc = obj.eset.expt(1).camcalinfo;
+    test_pixels_x = [100, 500];
+    test_pixels_y = [100, 500];
+    real_coords_x = cc.c2rX(test_pixels_x, test_pixels_y);
+    real_coords_y = cc.c2rY(test_pixels_x, test_pixels_y);
+    pixel_dist = sqrt((test_pixels_x(2) - test_pixels_x(1))^2 + (test_pixels_y(2) - test_pixels_y(1))^2);
+    real_dist = sqrt((real_coords_x(2) - real_coords_x(1))^2 + (real_coords_y(2) - real_coords_y(1))^2);
+    lengthPerPixel = real_dist / pixel_dist;
+end
@@ -205,7 +205,7 @@ class MAGATBridge:
         Uses the validated MATLAB method that detects 40 cycles correctly.
         
         Returns:
-            dict with 'onset_frames' (list of frame indices) and 'num_stimuli' (int)
+            dict with 'onset_frames' (int32 array of frame indices) and 'num_stimuli' (int)
         """
         try:
             self.eng.workspace['app'] = self.app
@@ -251,27 +251,25 @@ class MAGATBridge:
             onset_frames = self.eng.workspace['onset_frames']
             num_stimuli = int(float(self.eng.workspace['num_stimuli']))
             
-            # Convert MATLAB array to Python list
-            # Handle case where MATLAB returns tuple or empty array
-            if isinstance(onset_frames, tuple):
-                onset_list = []
-            elif hasattr(onset_frames, 'size') and onset_frames.size > 0:
-                onset_list = [int(x) for x in onset_frames.flatten()]
-            elif hasattr(onset_frames, '__len__') and len(onset_frames) > 0:
-                # Handle list or other sequence types
-                onset_list = [int(x) for x in onset_frames]
+            # Convert MATLAB array straight into an int32 array
+            # Empty MATLAB results come back as an empty tuple or None
+            if onset_frames is None or isinstance(onset_frames, tuple):
+                values = np.empty(0)
             else:
-                onset_list = []
+                # matlab.double exposes its flat column-major buffer as _data
+                values = np.asarray(getattr(onset_frames, '_data', onset_frames), dtype=np.float64).reshape(-1)
+            onset_array = np.empty(values.size, dtype=np.int32)
+            onset_array[:] = values
             
             return {
-                'onset_frames': onset_list,
+                'onset_frames': onset_array,
                 'num_stimuli': num_stimuli
             }
             
         except Exception as e:
             print(f"  [WARNING] Could not detect stimuli: {e}")
             return {
-                'onset_frames': [],
+                'onset_frames': np.empty(0, dtype=np.int32),
                 'num_stimuli': 0
             }
     
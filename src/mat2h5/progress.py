@@ -22,24 +22,31 @@ class ColoredProgress:
     Progress tracker with red (beginning), white (middle), blue (end) sections.
     """
     
-    def __init__(self, total: int, width: int = 60):
+    def __init__(self, total: int, width: int = 60, min_interval: float = 0.0):
         """
         Initialize progress tracker.
         
         Args:
             total: Total number of items to process
             width: Width of progress bar in characters
+            min_interval: Minimum seconds between redraws (0 = redraw on every update)
         """
         self.total = total
         self.width = width
+        self.min_interval = min_interval
         self.current = 0
         self.start_time = time.time()
+        self._last_draw = 0.0
         self.phase = 'beginning'  # beginning, middle, end
         
     def update(self, n: int = 1, message: str = ""):
         """Update progress by n items"""
         self.current = min(self.current + n, self.total)
         self._update_phase()
+        now = time.time()
+        if now - self._last_draw < self.min_interval and self.current < self.total:
+            return
+        self._last_draw = now
         self._display(message)
     
     def _update_phase(self):
@@ -19,7 +19,9 @@ import logging
 from pathlib import Path
 import time
 import re
-from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
 
 # Add parent to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent.parent.parent))
@@ -31,20 +33,29 @@ from mat2h5.config import get_magat_codebase
 CONVERT_SCRIPT = Path(__file__).parent / "convert_matlab_to_h5.py"
 MAT2H5_ROOT = Path(__file__).parent.parent.parent.parent
 
+# Max threads used to scan ESET folders concurrently (discovery is I/O-bound)
+DISCOVERY_WORKERS = 16
+
+GENOTYPE_RE = re.compile(r'^([A-Za-z0-9]+@[A-Za-z0-9]+)_')
+
+
+@lru_cache(maxsize=None)
+def _parent_genotype(parent_name: str) -> Optional[str]:
+    """Genotype implied by an ESET's parent folder name (e.g. GMR61@GMR61)"""
+    if parent_name and '@' in parent_name:
+        parts = parent_name.split('@')
+        if len(parts) == 2 and parts[0] == parts[1]:
+            return parent_name
+    return None
+
 
 def parse_genotype_from_path(eset_path: Path, mat_filename: str) -> Optional[str]:
     """Parse genotype from mat filename or parent folder path"""
-    match = re.search(r'^([A-Za-z0-9]+@[A-Za-z0-9]+)_', mat_filename)
+    match = GENOTYPE_RE.search(mat_filename)
     if match:
         return match.group(1)
     
-    parent = eset_path.parent
-    if parent.name and '@' in parent.name:
-        parts = parent.name.split('@')
-        if len(parts) == 2 and parts[0] == parts[1]:
-            return parent.name
-    
-    return None
+    return _parent_genotype(eset_path.parent.name)
 
 
 def extract_timestamp_from_mat(mat_filename: str) -> Optional[str]:
@@ -53,40 +64,66 @@ def extract_timestamp_from_mat(mat_filename: str) -> Optional[str]:
     return match.group(1) if match else None
 
 
-def detect_experiments_in_eset(eset_dir: Path) -> List[Dict]:
+def detect_existing_outputs(output_dir: Path) -> set:
+    """Return base names of H5 files already present in output_dir"""
+    return {p.stem for p in output_dir.glob("*.h5")}
+
+
+def detect_experiments_in_eset(eset_dir: Path, done: Optional[set] = None,
+                               log: Callable[[str], None] = print) -> List[Dict]:
     """
     Detect all experiments in an ESET folder.
     
     Uses matfiles/ directory for .mat files (MATLAB expects these, not btdfiles/).
+    
+    If ``done`` is given, experiments whose base name is in it are returned
+    marked ``skipped_early`` without validating their input files.
+    
+    Progress and skip messages go to ``log`` (print by default); threaded
+    callers pass a per-ESET collector and print the lines themselves.
     """
     matfiles_dir = eset_dir / "matfiles"
     
     if not matfiles_dir.exists():
-        print(f"  [ERROR] matfiles directory not found: {matfiles_dir}")
+        log(f"  [ERROR] matfiles directory not found: {matfiles_dir}")
         return []
     
-    # Find all .mat files in matfiles/ (MATLAB expects these)
-    mat_files = list(matfiles_dir.glob("*.mat"))
+    # Find all .mat files in matfiles/ (MATLAB expects these); scandir avoids
+    # building a Path and an extra stat for every directory entry
+    with os.scandir(matfiles_dir) as it:
+        mat_files = sorted((e for e in it if e.name.endswith('.mat')), key=lambda e: e.name)
     
     if not mat_files:
-        print(f"  [WARNING] No .mat files found in {matfiles_dir}")
+        log(f"  [WARNING] No .mat files found in {matfiles_dir}")
         return []
     
-    print(f"  Found {len(mat_files)} .mat files in matfiles/")
+    log(f"  Found {len(mat_files)} .mat files in matfiles/")
     
     experiments = []
     
-    for mat_file in sorted(mat_files):
-        timestamp = extract_timestamp_from_mat(mat_file.name)
+    for entry in mat_files:
+        mat_name = entry.name
+        timestamp = extract_timestamp_from_mat(mat_name)
         if not timestamp:
-            print(f"  [SKIP] Could not extract timestamp from {mat_file.name}")
+            log(f"  [SKIP] Could not extract timestamp from {mat_name}")
             continue
         
-        base_name = mat_file.stem
-        genotype = parse_genotype_from_path(eset_dir, mat_file.name)
+        base_name = mat_name[:-len('.mat')]
+        genotype = parse_genotype_from_path(eset_dir, mat_name)
         
         if not genotype:
-            print(f"  [SKIP] Could not parse genotype from {mat_file.name}")
+            log(f"  [SKIP] Could not parse genotype from {mat_name}")
+            continue
+        
+        # Output already exists - skip input validation entirely
+        if done is not None and base_name in done:
+            experiments.append({
+                'mat_file': Path(entry.path),
+                'base_name': base_name,
+                'timestamp': timestamp,
+                'genotype': genotype,
+                'skipped_early': True
+            })
             continue
         
         # Tracks directory: in matfiles/ subdirectory
@@ -104,11 +141,9 @@ def detect_experiments_in_eset(eset_dir: Path) -> List[Dict]:
         led1_bin = sup_data_dir / f"{base_name} led1 values.bin"
         led2_bin = sup_data_dir / f"{base_name} led2 values.bin"
         
-        # Validate ALL required files exist
+        # Validate ALL required files exist (the MAT file came from the listing)
         missing_files = []
         
-        if not mat_file.exists():
-            missing_files.append(f"MAT file: {mat_file}")
         if not tracks_dir.exists():
             missing_files.append(f"Tracks directory: {tracks_dir}")
         if not bin_file.exists():
@@ -121,13 +156,13 @@ def detect_experiments_in_eset(eset_dir: Path) -> List[Dict]:
         has_led2 = led2_bin.exists()
         
         if missing_files:
-            print(f"  [SKIP] {mat_file.name} - missing files:")
+            log(f"  [SKIP] {mat_name} - missing files:")
             for f in missing_files:
-                print(f"    - {f}")
+                log(f"    - {f}")
             continue
         
         experiments.append({
-            'mat_file': mat_file,
+            'mat_file': Path(entry.path),
             'tracks_dir': tracks_dir,
             'bin_file': bin_file,
             'sup_data_dir': sup_data_dir,
@@ -151,8 +186,8 @@ def export_experiment(file_info: Dict, output_dir: Path, codebase_path: Path = N
     # Output filename matches base_name with .h5 extension
     output_file = output_dir / f"{base_name}.h5"
     
-    # Check if file exists and skip if requested
-    if skip_existing and output_file.exists():
+    # Check if file exists and skip if requested (skipped_early: already known to exist)
+    if skip_existing and (file_info.get('skipped_early') or output_file.exists()):
         if logger:
             logger.info(f"Skipping {base_name} - file already exists: {output_file}")
         return {
@@ -166,7 +201,6 @@ def export_experiment(file_info: Dict, output_dir: Path, codebase_path: Path = N
         }
     
     if dry_run:
-        print(f"  [DRY-RUN] Would convert: {base_name} -> {output_file.name}")
         return {
             'success': True,
             'output_file': output_file,
@@ -180,10 +214,6 @@ def export_experiment(file_info: Dict, output_dir: Path, codebase_path: Path = N
     if logger:
         logger.info(f"Exporting {base_name} -> {output_file.name}")
     
-    print(f"\n  Exporting: {base_name}")
-    print(f"    MAT: {file_info['mat_file'].name}")
-    print(f"    Output: {output_file.name}")
-    
     # Build command
     cmd = [
         sys.executable,
@@ -198,6 +228,13 @@ def export_experiment(file_info: Dict, output_dir: Path, codebase_path: Path = N
     if codebase_path:
         cmd.extend(['--codebase', str(codebase_path)])
     
+    # With a logger attached, keep child stdout off the terminal and only
+    # capture stderr so it can be logged if the export fails
+    if logger:
+        output_kwargs = {'stdout': subprocess.DEVNULL, 'stderr': subprocess.PIPE}
+    else:
+        output_kwargs = {'capture_output': False}
+    
     # Run export
     start_time = time.time()
     try:
@@ -205,17 +242,13 @@ def export_experiment(file_info: Dict, output_dir: Path, codebase_path: Path = N
             cmd,
             cwd=str(CONVERT_SCRIPT.parent),
             check=True,
-            capture_output=False,
-            text=True
+            text=True,
+            **output_kwargs
         )
         
         elapsed = time.time() - start_time
         file_size = output_file.stat().st_size / (1024 * 1024) if output_file.exists() else 0
         
-        print(f"\n  [SUCCESS] Export complete: {output_file.name}")
-        print(f"     Size: {file_size:.1f} MB")
-        print(f"     Time: {elapsed/60:.1f} minutes")
-        
         return {
             'success': True,
             'output_file': output_file,
@@ -227,8 +260,8 @@ def export_experiment(file_info: Dict, output_dir: Path, codebase_path: Path = N
         
     except subprocess.CalledProcessError as e:
         elapsed = time.time() - start_time
-        print(f"\n  [ERROR] Export failed after {elapsed/60:.1f} minutes")
-        print(f"     Error code: {e.returncode}")
+        if logger and e.stderr:
+            logger.error(f"Export of {base_name} failed (exit {e.returncode}):\n{e.stderr.strip()}")
         return {
             'success': False,
             'error': f"Exit code {e.returncode}",
@@ -238,7 +271,6 @@ def export_experiment(file_info: Dict, output_dir: Path, codebase_path: Path = N
         }
     except Exception as e:
         elapsed = time.time() - start_time
-        print(f"\n  [ERROR] Export failed: {e}")
         return {
             'success': False,
             'error': str(e),
@@ -248,6 +280,18 @@ def export_experiment(file_info: Dict, output_dir: Path, codebase_path: Path = N
         }
 
 
+def format_status(result: Dict) -> str:
+    """One-line progress message summarizing an export result"""
+    base_name = result['base_name']
+    if not result.get('success'):
+        return f"[FAIL] {base_name}: {result.get('error', 'Unknown error')} ({result.get('time_min', 0):.1f} min)"
+    if result.get('skipped'):
+        return f"[OK] {base_name} (skipped)"
+    if result.get('dry_run'):
+        return f"[DRY-RUN] Would convert: {base_name} -> {result['output_file'].name}"
+    return f"[OK] {base_name} - {result['file_size_mb']:.1f} MB in {result['time_min']:.1f} min"
+
+
 def load_progress(output_dir: Path) -> set:
     """Load progress tracking file"""
     progress_file = output_dir / ".progress.json"
@@ -299,10 +343,24 @@ def process_genotype(root_dir: Path, output_dir: Path, codebase_path: Path = Non
     
     print(f"Found {len(eset_folders)} ESET folders")
     
-    # Discover all experiments
+    # Existing outputs are looked up once so discovery can skip them cheaply
+    done = detect_existing_outputs(output_dir) if skip_existing else None
+    
+    # Discover all experiments (ESETs scanned concurrently, results kept in input order).
+    # Workers collect their messages instead of printing, so each ESET's lines
+    # are printed together from this thread
+    def scan_eset(eset_dir):
+        messages = []
+        return detect_experiments_in_eset(eset_dir, done, log=messages.append), messages
+    
+    eset_folders = sorted(eset_folders)
+    with ThreadPoolExecutor(max_workers=min(DISCOVERY_WORKERS, len(eset_folders))) as ex:
+        per_eset = list(ex.map(scan_eset, eset_folders))
+    
     all_experiments = []
-    for eset_dir in sorted(eset_folders):
-        experiments = detect_experiments_in_eset(eset_dir)
+    for eset_dir, (experiments, messages) in zip(eset_folders, per_eset):
+        for line in messages:
+            print(line)
         for exp in experiments:
             exp['eset_name'] = eset_dir.name
             all_experiments.append(exp)
@@ -346,9 +404,7 @@ def process_genotype(root_dir: Path, output_dir: Path, codebase_path: Path = Non
             completed_list.append(base_name)
             if resume:
                 save_progress(output_dir, completed_list)
-            progress.update(1, f"[OK] {base_name}")
-        else:
-            progress.update(1, f"[FAIL] {base_name} failed")
+        progress.update(1, format_status(result))
     
     progress.finish("All experiments processed")
     
@@ -508,7 +564,8 @@ Examples:
             return 1
         
         print_red_header(f"Processing ESET: {eset_dir.name}")
-        experiments = detect_experiments_in_eset(eset_dir)
+        done = detect_existing_outputs(output_dir) if args.skip_existing else None
+        experiments = detect_experiments_in_eset(eset_dir, done)
         if not experiments:
             print(f"[ERROR] No complete experiments found in {eset_dir}")
             return 1
@@ -526,10 +583,7 @@ Examples:
                                      args.skip_existing, args.dry_run, logger)
             all_results.append(result)
             
-            if result.get('success'):
-                progress.update(1, f"[OK] {file_info['base_name']}")
-            else:
-                progress.update(1, f"[FAIL] {file_info['base_name']} failed")
+            progress.update(1, format_status(result))
         
         progress.finish()
     elif args.root_dir:
@@ -28,7 +28,12 @@ def check_stimuli_status(h5_file: Path) -> dict:
                 
                 if 'num_cycles' in stim_grp.attrs:
                     result['num_cycles'] = int(stim_grp.attrs['num_cycles'])
-                
+
+                # num_cycles == 0 already means needs_fix; skip the onset_frames lookup
+                if result['num_cycles'] == 0:
+                    result['needs_fix'] = True
+                    return result
+
                 if 'onset_frames' in stim_grp:
                     onset_frames = stim_grp['onset_frames']
                     result['onset_frames_count'] = len(onset_frames) if onset_frames.size > 0 else 0
@@ -19,6 +19,13 @@ import time
 import numpy as np
 import h5py
 import os
+import queue
+import threading
+
+try:
+    import hdf5plugin
+except ImportError:
+    hdf5plugin = None
 
 # Import MAGAT Bridge from mat2h5 package
 # Path: src/scripts/convert/
@@ -27,10 +34,104 @@ sys.path.insert(0, str(src_path.parent))
 
 try:
     from mat2h5.bridge import MAGATBridge
+    from mat2h5.progress import ColoredProgress
 except ImportError:
     # Fallback: try adding src to path
     sys.path.insert(0, str(src_path.parent))
     from mat2h5.bridge import MAGATBridge
+    from mat2h5.progress import ColoredProgress
+
+
+COMPRESSION_CHOICES = ('lzf', 'blosc_lz4', 'gzip')
+
+
+def get_compression(name='lzf'):
+    """
+    Return create_dataset keyword arguments for the named compression.
+    
+    lzf ships with h5py and is much faster than gzip at a slightly larger size.
+    blosc_lz4 needs hdf5plugin (also on the reading side); falls back to lzf
+    when it is not installed. All options byte-shuffle the data first, which
+    groups similar exponent/mantissa bytes of float arrays and compresses
+    considerably better.
+    """
+    if name == 'blosc_lz4':
+        if hdf5plugin is None:
+            print("  [WARNING] hdf5plugin not installed, using lzf compression instead")
+            return get_compression('lzf')
+        return dict(hdf5plugin.Blosc(cname='lz4', clevel=5, shuffle=hdf5plugin.Blosc.SHUFFLE))
+    if name == 'gzip':
+        return {'compression': 'gzip', 'compression_opts': 6, 'shuffle': True}
+    if name == 'lzf':
+        return {'compression': 'lzf', 'shuffle': True}
+    raise ValueError(f"Unknown compression '{name}', expected one of {COMPRESSION_CHOICES}")
+
+
+def _to_np(val, dtype=None):
+    """
+    Convert a MATLAB engine value to an ndarray without a Python-list round trip.
+    
+    matlab.double, matlab.single, matlab.int* etc. keep their elements in a
+    flat column-major ``_data`` buffer, which is wrapped directly (no copy).
+    Anything else (lists, scalars, ndarrays) goes through np.asarray.
+    """
+    data = getattr(val, '_data', None)
+    size = getattr(val, 'size', None)
+    arr = None
+    if data is not None and isinstance(size, tuple):
+        try:
+            arr = np.asarray(memoryview(data)).reshape(size, order='F')
+            if type(val).__name__ == 'logical' and arr.itemsize == 1:
+                arr = arr.view(np.bool_)
+        except (TypeError, ValueError):
+            arr = None
+    if arr is None:
+        arr = np.asarray(val)
+    if dtype is not None:
+        arr = arr.astype(dtype, copy=False)
+    return arr
+
+
+# Target uncompressed chunk size; h5py's auto-chunking picks much smaller
+# chunks for long 1-D track arrays
+CHUNK_TARGET_BYTES = 256 * 1024
+
+# Per-track datasets below this size are stored contiguous and unfiltered;
+# every chunked dataset costs its own B-tree and the savings are negligible
+SMALL_DATASET_BYTES = 4 * 1024
+
+# Tracks fetched per MATLAB engine call in export_tier2_magat
+TRACK_BATCH_SIZE = 50
+
+# Raw point coordinates (pixels) don't need double precision; area (not a
+# coordinate), derived quantities, ETI and lengthPerPixel keep their source
+# float64 for exact MATLAB validation
+COORD_DTYPE = np.float32
+
+# Print full tracebacks for recoverable export warnings (--verbose)
+VERBOSE = False
+
+# Global quantity fieldname -> H5 group name
+_GQ_TABLE = str.maketrans({' ': '_', '-': '_', '(': '', ')': ''})
+
+
+def chunk_shape(arr):
+    """Chunk shape of about CHUNK_TARGET_BYTES, halving the longest axis until it fits"""
+    if arr.ndim == 0 or arr.size == 0:
+        return None
+    chunks = list(arr.shape)
+    while np.prod(chunks) * arr.dtype.itemsize > CHUNK_TARGET_BYTES and max(chunks) > 1:
+        longest = chunks.index(max(chunks))
+        chunks[longest] = (chunks[longest] + 1) // 2
+    return tuple(chunks)
+
+
+def _dset(grp, name, arr, comp):
+    """Create a compressed dataset with an explicit chunk shape"""
+    if arr.nbytes < SMALL_DATASET_BYTES:
+        # Contiguous: no chunk index or filter pipeline for a few KB of data
+        return grp.create_dataset(name, data=arr, dtype=arr.dtype)
+    return grp.create_dataset(name, data=arr, dtype=arr.dtype, chunks=chunk_shape(arr), **comp)
 
 
 def export_derivation_rules(bridge, h5_file):
@@ -48,7 +149,7 @@ def export_derivation_rules(bridge, h5_file):
     
     try:
         # Get derivation rules from first track (same for all tracks in experiment)
-        bridge.eng.workspace['app'] = bridge.app
+        # Expects 'app' already in the MATLAB workspace (see export_tier2_magat)
         # MATLAB returns DerivationRules as matlab.object, not dict
         # Must extract each field individually via eval
         smoothTime = float(bridge.eng.eval("app.eset.expt(1).track(1).dr.smoothTime", nargout=1))
@@ -70,7 +171,97 @@ def export_derivation_rules(bridge, h5_file):
         print(f"  [OK] Using default derivation_rules (smoothTime=0.2, derivTime=0.1, interpTime=0.05)")
 
 
-def export_tier2_magat(bridge, output_file):
+def write_track(tracks_grp, track_id, track_data, comp):
+    """Write one getCompleteTrackData struct to tracks/track_<id>"""
+    track_grp = tracks_grp.create_group(f'track_{track_id}')
+    
+    # Metadata
+    if 'metadata' in track_data:
+        meta_grp = track_grp.create_group('metadata')
+        meta = track_data['metadata']
+        if hasattr(meta, 'items'):
+            meta_grp.attrs.update({k: float(v) for k, v in meta.items()
+                                   if isinstance(v, (int, float))})
+    
+    # State arrays
+    if 'state' in track_data:
+        state_grp = track_grp.create_group('state')
+        for key in track_data['state'].keys() if hasattr(track_data['state'], 'keys') else []:
+            val = track_data['state'][key]
+            if val is None:
+                continue
+            arr = _to_np(val)
+            if arr.size > 0:
+                _dset(state_grp, key, arr, comp)
+    
+    # Points
+    if 'points' in track_data:
+        pts_grp = track_grp.create_group('points')
+        
+        _dset(pts_grp, 'mid', _to_np(track_data['points']['mid'], COORD_DTYPE), comp)
+        _dset(pts_grp, 'head', _to_np(track_data['points']['head'], COORD_DTYPE), comp)
+        _dset(pts_grp, 'tail', _to_np(track_data['points']['tail'], COORD_DTYPE), comp)
+        
+        if 'loc' in track_data['points']:
+            _dset(pts_grp, 'loc', _to_np(track_data['points']['loc'], COORD_DTYPE), comp)
+        if 'area' in track_data['points']:
+            _dset(pts_grp, 'area', _to_np(track_data['points']['area']), comp)
+        
+        # Concatenated contours. As with len() on the MATLAB array, only a
+        # 0-row array is skipped; (2, 0) is still written as an empty dataset
+        contour_pts = _to_np(track_data['points']['contour_points'], COORD_DTYPE)
+        if contour_pts.ndim and len(contour_pts) > 0:
+            _dset(pts_grp, 'contour_points', contour_pts, comp)
+            _dset(pts_grp, 'contour_indices', _to_np(track_data['points']['contour_indices']), comp)
+        
+        # Concatenated spine
+        spine_pts = _to_np(track_data['points']['spine_points'], COORD_DTYPE)
+        if spine_pts.ndim and len(spine_pts) > 0:
+            _dset(pts_grp, 'spine_points', spine_pts, comp)
+            _dset(pts_grp, 'spine_indices', _to_np(track_data['points']['spine_indices']), comp)
+    
+    # Derived quantities (ALL fields)
+    if 'derived' in track_data and track_data['derived']:
+        deriv_grp = track_grp.create_group('derived_quantities')
+        
+        derived_dict = track_data['derived']
+        for field_name in derived_dict.keys() if hasattr(derived_dict, 'keys') else []:
+            val = derived_dict[field_name]
+            if val is None:
+                continue
+            arr = _to_np(val)
+            if arr.size > 0:
+                _dset(deriv_grp, field_name, arr, comp)
+    
+    track_grp.attrs['id'] = track_id
+
+
+def _track_writer(tracks_grp, comp, progress, track_queue, errors):
+    """
+    Consume (first_track_id, batch) items from track_queue until None.
+    
+    All HDF5 writes for tracks happen on this one thread; h5py is not safe
+    for concurrent writers. After the first failure the remaining batches
+    are drained without writing so the producer never blocks on put().
+    """
+    while True:
+        item = track_queue.get()
+        if item is None:
+            return
+        if errors:
+            continue
+        batch_start, batch = item
+        track_id = batch_start
+        try:
+            for track_id, track_data in enumerate(batch, start=batch_start):
+                write_track(tracks_grp, track_id, track_data, comp)
+                progress.update(1, f"track {track_id}")
+        except Exception as e:
+            print(f"\n  [ERROR] Track {track_id}: {e}")
+            errors.append(e)
+
+
+def export_tier2_magat(bridge, output_file, compression='lzf'):
     """Export complete MAGAT structure with ETI at root"""
     
     print("=" * 70)
@@ -78,8 +269,11 @@ def export_tier2_magat(bridge, output_file):
     print("=" * 70)
     print()
     
-    # Ensure app is in MATLAB workspace
+    # Put app in the MATLAB workspace once; every eval below (including
+    # export_derivation_rules) relies on it persisting there
     bridge.eng.workspace['app'] = bridge.app
+    if not bridge.eng.eval("exist('app','var')", nargout=1):
+        raise RuntimeError("Could not place DataManager 'app' in the MATLAB workspace")
     info = bridge.eng.eval("app.getInfo()", nargout=1)
     num_tracks = int(float(info['num_tracks']))
     num_frames = int(float(info['num_frames']))
@@ -89,7 +283,7 @@ def export_tier2_magat(bridge, output_file):
     print()
     
     start_time = time.time()
-    comp = {'compression': 'gzip', 'compression_opts': 6}
+    comp = get_compression(compression)
     
     # Check if output file exists and handle locking
     output_path = Path(output_file)
@@ -110,14 +304,17 @@ def export_tier2_magat(bridge, output_file):
                 'output_file': str(output_path)
             }
     
-    with h5py.File(output_file, 'w') as f:
+    # libver='latest' uses compact/dense link storage, which keeps group
+    # creation fast with thousands of track subgroups. Every dataset is
+    # written whole exactly once, so the chunk cache never gets a hit.
+    with h5py.File(output_file, 'w', libver='latest', track_order=True,
+                   rdcc_nbytes=0, rdcc_nslots=1) as f:
         # === EXPERIMENT GLOBALS ===
         print("Exporting experiment globals...")
         
         # Export derivation rules for head-swing calculation (INDYsim compatibility)
         export_derivation_rules(bridge, f)
         
-        bridge.eng.workspace['app'] = bridge.app
         expt_data = bridge.eng.eval("app.getCompleteExperiment()", nargout=1)
         
         # Experiment info
@@ -136,21 +333,19 @@ def export_tier2_magat(bridge, output_file):
         # Global quantities (ALL fields)
         gq_grp = f.create_group('global_quantities')
         
-        bridge.eng.workspace['app'] = bridge.app
-        num_gq = int(float(bridge.eng.eval("length(app.eset.expt(1).globalQuantity)", nargout=1)))
+        # All fields fetched in one MATLAB call
+        gq_fields = bridge.eng.eval("app.getAllGlobalQuantities()", nargout=1)
+        num_gq = len(gq_fields)
         
         print(f"  Exporting {num_gq} global quantities...")
         
-        for i in range(1, num_gq + 1):
-            bridge.eng.workspace['gq_idx'] = float(i)
-            gq_field_data = bridge.eng.eval("app.getGlobalQuantity(gq_idx)", nargout=1)
-            
-            field_name = str(gq_field_data['fieldname']).replace(' ', '_').replace('-', '_').replace('(', '').replace(')', '')
+        for gq_field_data in gq_fields:
+            field_name = str(gq_field_data['fieldname']).translate(_GQ_TABLE)
             field_grp = gq_grp.create_group(field_name)
             
             if 'yData' in gq_field_data:
-                ydata = np.array(gq_field_data['yData']).flatten()
-                field_grp.create_dataset('yData', data=ydata, **comp)
+                ydata = _to_np(gq_field_data['yData']).reshape(-1)
+                _dset(field_grp, 'yData', ydata, comp)
             
             field_grp.attrs['fieldname'] = str(gq_field_data['fieldname'])
         
@@ -158,16 +353,15 @@ def export_tier2_magat(bridge, output_file):
         
         # === EXPORT ETI TO ROOT (CRITICAL FOR SIMULATION SCRIPTS) ===
         print(f"\n  Extracting ETI from experiment.elapsedTime...")
-        bridge.eng.workspace['app'] = bridge.app
         eti_result = bridge.eng.eval("app.eset.expt(1).elapsedTime", nargout=1)
         
         if eti_result is not None:
-            eti_data = np.array(eti_result).flatten()
+            eti_data = _to_np(eti_result).reshape(-1)
             if len(eti_data) > 0:
                 print(f"    [OK] Found elapsedTime: {len(eti_data)} frames")
                 print(f"         Range: {eti_data[0]:.3f} to {eti_data[-1]:.3f} seconds")
                 print(f"  Exporting ETI to root: {len(eti_data)} frames")
-                f.create_dataset('eti', data=eti_data, **comp)
+                _dset(f, 'eti', eti_data, comp)
                 print(f"    [OK] ETI exported to root")
             else:
                 print(f"    [WARNING] elapsedTime array is empty!")
@@ -180,71 +374,34 @@ def export_tier2_magat(bridge, output_file):
         
         # === TRACKS ===
         print(f"Exporting {num_tracks} tracks with complete data...")
-        tracks_grp = f.create_group('tracks')
+        tracks_grp = f.create_group('tracks', track_order=True)
         
         # Process tracks in sorted order (1, 2, 3, ..., num_tracks)
         # This ensures tracks are stored in H5 file in numeric order
-        # H5 files preserve insertion order, so this guarantees track_1, track_2, ..., track_N
-        for track_id in sorted(range(1, num_tracks + 1)):
-            print(f"  Track {track_id}/{num_tracks}...", end=' ', flush=True)
-            
-            bridge.eng.workspace['track_id'] = float(track_id)
-            track_data = bridge.eng.eval("app.getCompleteTrackData(track_id)", nargout=1)
-            
-            track_grp = tracks_grp.create_group(f'track_{track_id}')
-            
-            # Metadata
-            if 'metadata' in track_data:
-                meta_grp = track_grp.create_group('metadata')
-                for key in track_data['metadata'].keys() if hasattr(track_data['metadata'], 'keys') else []:
-                    val = track_data['metadata'][key]
-                    if isinstance(val, (int, float)):
-                        meta_grp.attrs[key] = float(val)
-            
-            # State arrays
-            if 'state' in track_data:
-                state_grp = track_grp.create_group('state')
-                for key in track_data['state'].keys() if hasattr(track_data['state'], 'keys') else []:
-                    val = track_data['state'][key]
-                    if val is not None and len(val) > 0:
-                        state_grp.create_dataset(key, data=np.array(val), **comp)
-            
-            # Points
-            if 'points' in track_data:
-                pts_grp = track_grp.create_group('points')
-                
-                pts_grp.create_dataset('mid', data=np.array(track_data['points']['mid']), **comp)
-                pts_grp.create_dataset('head', data=np.array(track_data['points']['head']), **comp)
-                pts_grp.create_dataset('tail', data=np.array(track_data['points']['tail']), **comp)
-                
-                if 'loc' in track_data['points']:
-                    pts_grp.create_dataset('loc', data=np.array(track_data['points']['loc']), **comp)
-                if 'area' in track_data['points']:
-                    pts_grp.create_dataset('area', data=np.array(track_data['points']['area']), **comp)
-                
-                # Concatenated contours
-                if len(track_data['points']['contour_points']) > 0:
-                    pts_grp.create_dataset('contour_points', data=np.array(track_data['points']['contour_points']), **comp)
-                    pts_grp.create_dataset('contour_indices', data=np.array(track_data['points']['contour_indices']), **comp)
-                
-                # Concatenated spine
-                if len(track_data['points']['spine_points']) > 0:
-                    pts_grp.create_dataset('spine_points', data=np.array(track_data['points']['spine_points']), **comp)
-                    pts_grp.create_dataset('spine_indices', data=np.array(track_data['points']['spine_indices']), **comp)
-            
-            # Derived quantities (ALL fields)
-            if 'derived' in track_data and track_data['derived']:
-                deriv_grp = track_grp.create_group('derived_quantities')
-                
-                derived_dict = track_data['derived']
-                for field_name in derived_dict.keys() if hasattr(derived_dict, 'keys') else []:
-                    val = derived_dict[field_name]
-                    if val is not None and len(val) > 0:
-                        deriv_grp.create_dataset(field_name, data=np.array(val), **comp)
-                        
-            
-            track_grp.attrs['id'] = track_id
-            print("[OK]")
+        # tracks_grp tracks link creation order, so this guarantees track_1, track_2, ..., track_N
+        # Tracks are fetched from MATLAB in batches (one engine round-trip per batch)
+        # while a single writer thread stores the previous batch
+        track_queue = queue.Queue(maxsize=2)
+        writer_errors = []
+        progress = ColoredProgress(num_tracks, min_interval=0.1)
+        writer = threading.Thread(
+            target=_track_writer,
+            args=(tracks_grp, comp, progress, track_queue, writer_errors),
+            daemon=True)
+        writer.start()
+        try:
+            for batch_start in range(1, num_tracks + 1, TRACK_BATCH_SIZE):
+                batch_end = min(batch_start + TRACK_BATCH_SIZE - 1, num_tracks)
+                batch = bridge.eng.eval(f"app.getAllTrackData({batch_start}, {batch_end})", nargout=1)
+                track_queue.put((batch_start, batch))
+                if writer_errors:
+                    break
+        finally:
+            track_queue.put(None)
+            writer.join()
+        if writer_errors:
+            raise writer_errors[0]
+        progress.finish(f"{num_tracks} tracks")
         
         print("  [OK] All tracks exported\n")
         
@@ -256,7 +413,7 @@ def export_tier2_magat(bridge, output_file):
             num_stimuli = stimuli.get('num_stimuli', 0)
             
             if len(onset_frames) > 0:
-                stim_grp.create_dataset('onset_frames', data=np.array(onset_frames, dtype=np.int32))
+                stim_grp.create_dataset('onset_frames', data=_to_np(onset_frames, np.int32))
                 stim_grp.attrs['num_cycles'] = num_stimuli
                 print(f"  [OK] Detected {num_stimuli} stimulus onsets")
             else:
@@ -265,49 +422,43 @@ def export_tier2_magat(bridge, output_file):
                 print(f"  [WARNING] No stimulus onsets detected")
         except Exception as e:
             print(f"  [WARNING] Could not detect stimuli: {e}")
-            import traceback
-            traceback.print_exc()
+            if VERBOSE:
+                import traceback
+                traceback.print_exc()
             stim_grp = f.create_group('stimulus')
             stim_grp.create_dataset('onset_frames', data=np.array([], dtype=np.int32))
             stim_grp.attrs['num_cycles'] = 0
         
         try:
-            bridge.eng.workspace['app'] = bridge.app
             led_data = bridge.eng.eval("app.led_data", nargout=1)
             if led_data is not None:
-                f.create_dataset('led_data', data=np.array(led_data).flatten().astype(np.float32), **comp)
+                _dset(f, 'led_data', _to_np(led_data, np.float32).reshape(-1), comp)
         except Exception as e:
             print(f"  [WARNING] Could not extract LED data: {e}")
         
         # Metadata
         meta_grp = f.create_group('metadata')
-        meta_grp.attrs['num_tracks'] = num_tracks
-        meta_grp.attrs['num_frames'] = num_frames
-        meta_grp.attrs['export_tier'] = 2
-        meta_grp.attrs['export_date'] = time.strftime('%Y-%m-%d %H:%M:%S')
-        meta_grp.attrs['has_eti'] = eti_data is not None
+        str_dtype = h5py.string_dtype()
+        meta_attrs = {
+            'num_tracks': (num_tracks, 'i8'),
+            'num_frames': (num_frames, 'i8'),
+            'export_tier': (2, 'i8'),
+            'coord_dtype': (np.dtype(COORD_DTYPE).name, str_dtype),
+            'export_date': (time.strftime('%Y-%m-%d %H:%M:%S'), str_dtype),
+            'has_eti': (eti_data is not None, np.bool_),
+        }
         if eti_data is not None:
-            meta_grp.attrs['eti_length'] = len(eti_data)
+            meta_attrs['eti_length'] = (len(eti_data), 'i8')
+        for key, (value, dtype) in meta_attrs.items():
+            meta_grp.attrs.create(key, value, dtype=dtype)
         
         # === EXPORT lengthPerPixel FROM CAMERA CALIBRATION ===
         # This is CRITICAL for converting pixel positions to real-world cm
         # MATLAB: cc = eset.expt(1).camcalinfo; lengthPerPixel = computed from c2rX/c2rY
         print("  Extracting lengthPerPixel from camera calibration...")
         try:
-            bridge.eng.workspace['app'] = bridge.app
             # Compute lengthPerPixel using same method as MATLAB validation scripts
-            lpp_code = """
-            cc = app.eset.expt(1).camcalinfo;
-            test_pixels_x = [100, 500];
-            test_pixels_y = [100, 500];
-            real_coords_x = cc.c2rX(test_pixels_x, test_pixels_y);
-            real_coords_y = cc.c2rY(test_pixels_x, test_pixels_y);
-            pixel_dist = sqrt((test_pixels_x(2) - test_pixels_x(1))^2 + (test_pixels_y(2) - test_pixels_y(1))^2);
-            real_dist = sqrt((real_coords_x(2) - real_coords_x(1))^2 + (real_coords_y(2) - real_coords_y(1))^2);
-            lengthPerPixel = real_dist / pixel_dist;
-            """
-            bridge.eng.eval(lpp_code, nargout=0)
-            length_per_pixel = float(bridge.eng.workspace['lengthPerPixel'])
+            length_per_pixel = float(bridge.eng.eval("app.getLengthPerPixel()", nargout=1))
             
             # Save to root AND metadata for easy access
             f.create_dataset('lengthPerPixel', data=length_per_pixel)
@@ -344,8 +495,15 @@ def main():
     parser.add_argument('--output', required=True, help='Output H5 file path')
     parser.add_argument('--codebase', default=None, help='Path to MAGAT codebase (or set MAGAT_CODEBASE env var)')
     parser.add_argument('--matlab-classes', default=None, help='Path to MATLAB classes (optional)')
+    parser.add_argument('--compression', choices=COMPRESSION_CHOICES, default='lzf',
+                        help='Dataset compression (default: lzf; blosc_lz4 requires hdf5plugin)')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Print full tracebacks for recoverable export warnings')
     args = parser.parse_args()
     
+    global VERBOSE
+    VERBOSE = args.verbose
+    
     # Get codebase path from argument or environment
     codebase_path = args.codebase or os.environ.get('MAGAT_CODEBASE')
     if not codebase_path:
@@ -362,7 +520,7 @@ def main():
     
     bridge.load_experiment(args.mat, args.tracks, args.bin)
     
-    stats = export_tier2_magat(bridge, args.output)
+    stats = export_tier2_magat(bridge, args.output, compression=args.compression)
     
     bridge.close()
     return stats
@@ -33,7 +33,8 @@ def check_file_integrity(file_path: Path) -> dict:
     result['size_mb'] = file_path.stat().st_size / (1024 * 1024)
     
     try:
-        with h5py.File(file_path, 'r') as f:
+        # locking=False: don't take (or wait on) the HDF5 file lock just to inspect
+        with h5py.File(file_path, 'r', locking=False) as f:
             # Check for required root keys
             required_keys = ['eti', 'tracks', 'metadata', 'global_quantities']
             has_all_keys = all(key in f for key in required_keys)
@@ -41,21 +42,21 @@ def check_file_integrity(file_path: Path) -> dict:
             if has_all_keys:
                 # Check ETI
                 eti_shape = f['eti'].shape if 'eti' in f else None
-                num_tracks = len(list(f['tracks'].keys())) if 'tracks' in f else 0
+                num_tracks = f['tracks'].id.get_num_objs() if 'tracks' in f else 0
+                metadata = dict(f['metadata'].attrs)
                 
                 result['valid'] = True
                 result['complete'] = (
                     eti_shape is not None and len(eti_shape) > 0 and
                     num_tracks > 0 and
-                    'has_eti' in f['metadata'].attrs and
-                    f['metadata'].attrs['has_eti']
+                    bool(metadata.get('has_eti', False))
                 )
                 
                 return {
                     **result,
                     'eti_shape': eti_shape,
                     'num_tracks': num_tracks,
-                    'metadata': dict(f['metadata'].attrs)
+                    'metadata': metadata
                 }
             else:
                 result['error'] = f'Missing required keys. Found: {list(f.keys())}'
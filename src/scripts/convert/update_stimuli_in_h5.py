@@ -25,7 +25,11 @@ Author: magatfairy
 Date: 2025-12-05
 """
 
+import multiprocessing
+import os
+import re
 import sys
+from functools import lru_cache, partial
 from pathlib import Path
 import numpy as np
 import h5py
@@ -38,6 +42,13 @@ sys.path.insert(0, str(src_path))
 
 from mat2h5.bridge import MAGATBridge
 
+# Small raw-data chunk cache: only tiny stimulus datasets are touched, so
+# the 1 MiB default is a wasted allocation per file open
+H5_CACHE = dict(rdcc_nbytes=64 * 1024, rdcc_nslots=521, rdcc_w0=0.75)
+
+# Repository-level exports/ directory (searched for --genotype-dir)
+_EXPORTS_DIR = Path(__file__).resolve().parents[3] / "exports"
+
 
 def find_mat_file_for_h5(h5_file: Path, genotype_dir: Optional[Path] = None) -> Optional[Path]:
     """
@@ -56,44 +67,49 @@ def find_mat_file_for_h5(h5_file: Path, genotype_dir: Optional[Path] = None) ->
         Path to .mat file if found, None otherwise
     """
     base_name = h5_file.stem
+    mat_name = os.path.normcase(f"{base_name}.mat")
     
-    # Try same directory
-    mat_file = h5_file.parent / f"{base_name}.mat"
-    if mat_file.exists():
-        return mat_file
-    
-    # Try matfiles/ subdirectory
-    mat_file = h5_file.parent / "matfiles" / f"{base_name}.mat"
-    if mat_file.exists():
-        return mat_file
-    
-    # Try parent/matfiles/
-    mat_file = h5_file.parent.parent / "matfiles" / f"{base_name}.mat"
-    if mat_file.exists():
-        return mat_file
-    
-    # Try searching up to 3 levels up
-    for level in range(1, 4):
-        search_dir = h5_file.parent
-        for _ in range(level):
-            search_dir = search_dir.parent
-        mat_file = search_dir / "matfiles" / f"{base_name}.mat"
-        if mat_file.exists():
-            return mat_file
+    # Same directory, matfiles/ subdirectory, then matfiles/ up to 3 levels up
+    search_dirs = [h5_file.parent, h5_file.parent / "matfiles"]
+    search_dirs += [ancestor / "matfiles" for ancestor in list(h5_file.parents)[1:4]]
     
     # If genotype_dir provided, search in its ESET subdirectories
-    if genotype_dir and genotype_dir.exists():
-        for eset_dir in genotype_dir.iterdir():
-            if eset_dir.is_dir():
-                matfiles_dir = eset_dir / "matfiles"
-                if matfiles_dir.exists():
-                    mat_file = matfiles_dir / f"{base_name}.mat"
-                    if mat_file.exists():
-                        return mat_file
+    if genotype_dir:
+        search_dirs += [Path(d) / "matfiles" for d in _list_subdirs(str(genotype_dir))]
+    
+    for search_dir in search_dirs:
+        if mat_name in _list_matfiles(str(search_dir)):
+            return search_dir / f"{base_name}.mat"
     
     return None
 
 
+@lru_cache(maxsize=None)
+def _list_matfiles(directory: str) -> frozenset:
+    """Names of .mat files in a directory (normcased; empty if missing). Cached per run."""
+    try:
+        with os.scandir(directory) as it:
+            return frozenset(os.path.normcase(e.name) for e in it if e.name.lower().endswith('.mat'))
+    except OSError:
+        return frozenset()
+
+
+@lru_cache(maxsize=8)
+def _exports_h5_list(directory: str, mtime_ns: int) -> tuple:
+    """Sorted .h5 paths in a directory; mtime_ns in the key invalidates the cache."""
+    return tuple(sorted(Path(directory) / name for name in os.listdir(directory) if name.endswith('.h5')))
+
+
+@lru_cache(maxsize=None)
+def _list_subdirs(directory: str) -> tuple:
+    """Sorted subdirectory paths of a directory (empty if missing). Cached per run."""
+    try:
+        with os.scandir(directory) as it:
+            return tuple(sorted(e.path for e in it if e.is_dir()))
+    except OSError:
+        return ()
+
+
 def find_tracks_and_bin_files(mat_file: Path) -> Tuple[Optional[Path], Optional[Path]]:
     """
     Find tracks directory and .bin file for a .mat file.
@@ -108,8 +124,6 @@ def find_tracks_and_bin_files(mat_file: Path) -> Tuple[Optional[Path], Optional[
     Returns:
         Tuple of (tracks_dir, bin_file) paths, or (None, None) if not found
     """
-    import re
-    
     base_name = mat_file.stem
     
     # Extract genotype and timestamp from filename
@@ -149,7 +163,7 @@ def find_tracks_and_bin_files(mat_file: Path) -> Tuple[Optional[Path], Optional[
 def check_needs_fix(h5_file: Path) -> bool:
     """Check if an H5 file needs stimulus data fix."""
     try:
-        with h5py.File(h5_file, 'r') as f:
+        with h5py.File(h5_file, 'r', **H5_CACHE) as f:
             if 'stimulus' not in f:
                 return True
             stim_grp = f['stimulus']
@@ -159,7 +173,8 @@ def check_needs_fix(h5_file: Path) -> bool:
             else:
                 onset_count = 0
             return num_cycles == 0 or onset_count == 0
-    except:
+    except (OSError, KeyError, ValueError):
+        # Unreadable or malformed stimulus data: treat as needing the fix
         return True
 
 
@@ -226,14 +241,21 @@ def update_stimuli_in_h5(h5_file: Path, mat_file: Optional[Path] = None, skip_if
         
         # Update H5 file
         print("  Updating H5 file...")
-        with h5py.File(h5_file, 'r+') as f:
-            # Delete existing stimulus group if it exists
-            if 'stimulus' in f:
-                del f['stimulus']
-            
-            # Create new stimulus group
-            stim_grp = f.create_group('stimulus')
-            stim_grp.create_dataset('onset_frames', data=np.array(onset_frames, dtype=np.int32))
+        onset_frames = np.asarray(onset_frames, dtype=np.int32)
+        with h5py.File(h5_file, 'r+', libver='latest', **H5_CACHE) as f:
+            existing = f.get('stimulus/onset_frames')
+            if existing is not None and existing.shape == onset_frames.shape and existing.dtype == onset_frames.dtype:
+                # Same size: overwrite in place (no unlink, no dead space)
+                existing[...] = onset_frames
+                stim_grp = f['stimulus']
+            else:
+                # Delete existing stimulus group if it exists
+                if 'stimulus' in f:
+                    del f['stimulus']
+                
+                # Create new stimulus group
+                stim_grp = f.create_group('stimulus')
+                stim_grp.create_dataset('onset_frames', data=onset_frames, track_times=False)
             stim_grp.attrs['num_cycles'] = num_stimuli
             
             # Update metadata if it exists
@@ -254,13 +276,46 @@ def update_stimuli_in_h5(h5_file: Path, mat_file: Optional[Path] = None, skip_if
 
 
 def find_h5_files_in_dir(directory: Path) -> List[Path]:
-    """Find all H5 files in a directory recursively."""
+    """Find all H5 files in a directory recursively (unreadable directories are skipped)."""
     h5_files = []
-    for h5_file in directory.rglob("*.h5"):
-        h5_files.append(h5_file)
+    stack = [str(directory)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith('.h5'):
+                        h5_files.append(Path(entry.path))
+        except OSError:
+            continue
     return sorted(h5_files)
 
 
+def _process_one(h5_file: Path, genotype_dir: Optional[Path] = None) -> bool:
+    """Pool worker: update one file (starts and closes its own MATLAB engine)."""
+    print(f"\n[{os.getpid()}] {h5_file.name}")
+    return update_stimuli_in_h5(h5_file, genotype_dir=genotype_dir)
+
+
+def process_files(h5_files: List[Path], jobs: int = 1, genotype_dir: Optional[Path] = None) -> List[bool]:
+    """
+    Update stimuli in each file, in order, returning one success flag per file.
+    
+    With jobs > 1 the files are spread over a multiprocessing.Pool; each
+    worker loads its .mat through a separate MATLAB engine.
+    """
+    if jobs <= 1 or len(h5_files) <= 1:
+        results = []
+        for i, h5_file in enumerate(h5_files, 1):
+            print(f"\n[{i}/{len(h5_files)}] {h5_file.name}")
+            results.append(update_stimuli_in_h5(h5_file, genotype_dir=genotype_dir))
+        return results
+    
+    with multiprocessing.Pool(min(jobs, len(h5_files))) as pool:
+        return pool.map(partial(_process_one, genotype_dir=genotype_dir), h5_files, chunksize=1)
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Update stimulus detection in existing H5 files',
@@ -275,6 +330,9 @@ Examples:
   
   # Update from genotype directory
   python update_stimuli_in_h5.py --genotype-dir D:/rawdata/GMR61@GMR61
+  
+  # Same, 4 files at a time (one MATLAB engine each)
+  python update_stimuli_in_h5.py --genotype-dir D:/rawdata/GMR61@GMR61 --jobs 4
         """
     )
     
@@ -282,6 +340,8 @@ Examples:
     parser.add_argument('--mat', type=str, help='Path to corresponding .mat file (optional, auto-detected)')
     parser.add_argument('--h5-dir', type=str, help='Directory containing H5 files to update')
     parser.add_argument('--genotype-dir', type=str, help='Genotype directory with ESET folders')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Files to process in parallel, each with its own MATLAB engine (default: 1)')
     
     args = parser.parse_args()
     
@@ -305,9 +365,10 @@ Examples:
     elif args.genotype_dir:
         genotype_dir = Path(args.genotype_dir)
         # Look for H5 files in exports or in the genotype directory itself
-        exports_dir = Path(__file__).parent.parent.parent.parent / "exports"
-        if exports_dir.exists():
-            h5_files = [f for f in exports_dir.glob("*.h5") if genotype_dir.name in f.stem]
+        if _EXPORTS_DIR.exists():
+            key = genotype_dir.name
+            h5_files = [h5 for h5 in _exports_h5_list(str(_EXPORTS_DIR), _EXPORTS_DIR.stat().st_mtime_ns)
+                        if key in h5.name[:-3]]
         else:
             h5_files = find_h5_files_in_dir(genotype_dir)
         print(f"Found {len(h5_files)} H5 files for genotype {genotype_dir.name}")
@@ -318,9 +379,8 @@ Examples:
         fail_count = 0
         
         # Pass genotype_dir to update function
-        for i, h5_file in enumerate(h5_files, 1):
-            print(f"\n[{i}/{len(h5_files)}] {h5_file.name}")
-            if update_stimuli_in_h5(h5_file, genotype_dir=genotype_dir):
+        for ok in process_files(h5_files, args.jobs, genotype_dir=genotype_dir):
+            if ok:
                 success_count += 1
             else:
                 fail_count += 1
@@ -347,9 +407,8 @@ Examples:
         success_count = 0
         fail_count = 0
         
-        for i, h5_file in enumerate(h5_files, 1):
-            print(f"\n[{i}/{len(h5_files)}] {h5_file.name}")
-            if update_stimuli_in_h5(h5_file):
+        for ok in process_files(h5_files, args.jobs):
+            if ok:
                 success_count += 1
             else:
                 fail_count += 1
@@ -1,25 +1,45 @@
 import re
 import os
 
+import numpy as np
+
 BASE_DIR = '/Users/gilraitses/INDYsim/scripts/2025-12-04/mat2h5'
 
+_JS_BLOCK_RE = re.compile(
+    r"^[^\n]*const fairyASCII = `[\s\S]*?"
+    r"console\.log\('Main fairy art element not found'\);[^\n]*(?:\n[^\n]*){2}",
+    re.MULTILINE)
+
+# Escape backslashes and backticks for a JS template literal in one pass
+_JS_ESCAPE = str.maketrans({'\\': '\\\\', '`': '\\`'})
+
 def main():
     # Read the fairy frames
-    with open(os.path.join(BASE_DIR, 'docs/fairy.yaml'), 'r') as f:
-        lines = f.readlines()
+    with open(os.path.join(BASE_DIR, 'docs/fairy.yaml'), 'rb') as f:
+        data = f.read()
+    # Binary mode skips universal newlines, so normalize CRLF/CR like text mode
+    data = data.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+
+    # Byte offset of the start of every line (plus end of file), so
+    # lines[a:b] is data[starts[a]:starts[b]]
+    newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 0x0A)
+    starts = np.concatenate(([0], newlines + 1, [len(data)]))
+
+    def line_slice(a, b):
+        return data[starts[min(a, len(starts) - 1)]:starts[min(b, len(starts) - 1)]].decode('utf-8')
 
     # Extract frames (using 1-based line numbers from earlier analysis, converting to 0-based)
     # Frame 1: Lines 1-75 -> indices 0-75
-    frame1 = "".join(lines[0:75])
+    frame1 = line_slice(0, 75)
     
     # Frame 2: Lines 79-153 -> indices 78-153
-    frame2 = "".join(lines[78:153])
+    frame2 = line_slice(78, 153)
     
     # Frame 3: Lines 155-229 -> indices 154-229
-    frame3 = "".join(lines[154:229])
+    frame3 = line_slice(154, 229)
     
     # Frame 4: Lines 236-310 -> indices 235-310
-    frame4 = "".join(lines[235:310])
+    frame4 = line_slice(235, 310)
 
     frames = [frame1, frame2, frame3, frame4]
     
@@ -27,7 +47,7 @@ def main():
     js_frames = "const fairyFrames = [\n"
     for i, frame in enumerate(frames):
         # Escape backticks and backslashes if any
-        safe_frame = frame.replace('\\', '\\\\').replace('`', '\\`')
+        safe_frame = frame.translate(_JS_ESCAPE)
         js_frames += f"    `{safe_frame}`,\n"
     js_frames += "];"
 
@@ -81,36 +101,13 @@ def main():
         }}, 150); // 150ms for gif-like animation
 """
 
-    # Remove the old variable and usage
-    # We'll search for "const fairyASCII =" and the following block.
-    # Since the string is huge, regex might be slow or hit limits if we aren't careful.
-    # Instead of regex for the huge string, let's find the start and end lines.
-    
-    lines_html = new_content.split('\n')
-    start_line = -1
-    end_line = -1
-    
-    for i, line in enumerate(lines_html):
-        if 'const fairyASCII = `' in line:
-            start_line = i
-        if start_line != -1 and 'console.log(\'Main fairy art element not found\');' in line:
-            # This captures the end of the logic block roughly
-            # The closing brace } for the else block is on the next line usually
-            end_line = i + 2 # Grab the closing brace
-            break
-            
-    if start_line != -1 and end_line != -1:
-        # Replace lines
-        new_lines = lines_html[:start_line] + [new_js_logic] + lines_html[end_line+1:]
-        new_content = '\n'.join(new_lines)
-    else:
-        print("Could not find JS start/end lines via simple search. Trying regex fallback.")
-        # Fallback regex
-        pattern = r"const fairyASCII = `[\s\S]*?console\.log\('Main fairy art element not found'\);\s+}"
-        if re.search(pattern, new_content):
-             new_content = re.sub(pattern, new_js_logic, new_content)
-        else:
-             print("Regex failed too.")
+    # Remove the old variable and usage: from the start of the
+    # "const fairyASCII = `" line through the two lines after the
+    # "Main fairy art element not found" log (the closing braces)
+    # Callable replacement: the frames contain backslashes
+    new_content, n = _JS_BLOCK_RE.subn(lambda m: new_js_logic, new_content, count=1)
+    if n == 0:
+        print("Could not find the fairyASCII JS block; leaving it unchanged.")
 
     # Write back
     with open(os.path.join(BASE_DIR, 'index.html'), 'w') as f:
@@ -0,0 +1,68 @@
+function out = extract_camcal(matpath)
+% EXTRACT_CAMCAL Camera calibration fields of an experiment .mat in one call
+%
+%   out = extract_camcal(matpath)
+%
+%   Loads the experiment, reads its camcalinfo and computes everything
+%   validate_camcal.py compares against the H5 export, so the Python side
+%   needs a single engine call per file instead of a load plus one eval
+%   per field.
+%
+%   Inputs:
+%       matpath - Path to the experiment .mat (holding either an
+%                 ExperimentSet 'eset' or a bare 'experiment')
+%
+%   Outputs:
+%       out - Struct with fields:
+%           .realx, .realy, .camx, .camy - Calibration point arrays
+%                                          (only those camcalinfo has)
+%           .lengthPerPixel   - cm per pixel from cc.c2rX/c2rY over the
+%                               (100,100)-(500,500) diagonal
+%           .tri_points       - [camx(:), camy(:)]
+%           .tri_connectivity - delaunay(camx, camy), 1-based
+%           .tri_error        - Message instead of the two tri_ fields if
+%                               the triangulation failed
+%
+%   Python caller: src/validation/validators/validate_camcal.py
+
+data = load(matpath);
+
+% Handle variable naming
+if isfield(data, 'experiment')
+    eset = ExperimentSet();
+    eset.expt = data.experiment;
+else
+    eset = data.eset;
+end
+cc = eset.expt(1).camcalinfo;
+
+out = struct();
+
+% Calibration point arrays
+fields = {'realx', 'realy', 'camx', 'camy'};
+for i = 1:numel(fields)
+    try
+        out.(fields{i}) = cc.(fields{i});
+    catch
+        % Field not present on this calibration; skipped
+    end
+end
+
+% lengthPerPixel
+test_pixels_x = [100, 500];
+test_pixels_y = [100, 500];
+real_coords_x = cc.c2rX(test_pixels_x, test_pixels_y);
+real_coords_y = cc.c2rY(test_pixels_x, test_pixels_y);
+pixel_dist = sqrt((test_pixels_x(2) - test_pixels_x(1))^2 + (test_pixels_y(2) - test_pixels_y(1))^2);
+real_dist = sqrt((real_coords_x(2) - real_coords_x(1))^2 + (real_coords_y(2) - real_coords_y(1))^2);
+out.lengthPerPixel = real_dist / pixel_dist;
+
+% Triangulation
+try
+    out.tri_connectivity = delaunay(cc.camx, cc.camy);
+    out.tri_points = [cc.camx(:), cc.camy(:)];
+catch ME
+    out.tri_error = ME.message;
+end
+
+end
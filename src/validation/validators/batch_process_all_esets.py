@@ -10,47 +10,116 @@ Author: mechanosensation validation framework
 Date: 2025-12-04
 """
 
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 import shutil
 
 # Add paths for imports
 sys.path.insert(0, str(Path(__file__).parent))
 
-from validate_h5_schema import validate_h5_schema
+from validate_h5_schema import validate_h5_schema, ValidationResult
+from validation_cache import CACHE_DIR, cache_key, load_cache, save_cache
+
+
+# Validation outcomes from earlier runs, keyed by path + mtime + size, so
+# re-runs (e.g. after appending camcal) only reopen files that changed.
+# Bump CACHE_VERSION when validate_h5_schema's checks change.
+CACHE_PATH = CACHE_DIR / '.camcal_status_cache.json'
+CACHE_VERSION = 1
 
 
 def find_all_esets(base_dir: Path):
-    """Find all eset directories with h5_exports."""
+    """
+    Find all eset directories with h5_exports and matfiles.
+    
+    Returns sorted (eset_dir, h5_files) pairs; the H5 list is collected in
+    the same pass, one scandir per directory.
+    """
     esets = []
-    for item in base_dir.iterdir():
-        if item.is_dir():
-            h5_dir = item / "h5_exports"
-            matfiles_dir = item / "matfiles"
-            if h5_dir.exists() and matfiles_dir.exists():
-                esets.append(item)
+    with os.scandir(base_dir) as it:
+        candidates = [e.path for e in it if e.is_dir()]
+    for item in candidates:
+        with os.scandir(item) as it:
+            subdirs = {e.name: e.path for e in it if e.is_dir()}
+        if 'h5_exports' in subdirs and 'matfiles' in subdirs:
+            with os.scandir(subdirs['h5_exports']) as it:
+                h5_files = sorted(Path(e.path) for e in it if e.name.endswith('.h5'))
+            esets.append((Path(item), h5_files))
     return sorted(esets)
 
 
-def find_h5_files(eset_dir: Path):
-    """Find all H5 files in an eset's h5_exports directory."""
-    h5_dir = eset_dir / "h5_exports"
-    if h5_dir.exists():
-        return sorted(h5_dir.glob("*.h5"))
-    return []
+def has_camcal(results) -> bool:
+    """Check schema results for a root lengthPerPixel dataset."""
+    return any(r.field == '/lengthPerPixel' and r.passed for r in results)
+
+
+def _validate_one(h5_path: Path):
+    """
+    Process-pool worker: validate one H5 file (results are pickleable).
+    
+    The camcal check reads the same results, so each file is opened once.
+    """
+    passed, results = validate_h5_schema(h5_path)
+    return passed, results, has_camcal(results)
+
+
+def _fast_copy(src: Path, dst: Path):
+    """
+    Copy file contents without a userspace read/write loop where possible.
+    
+    Linux: os.copy_file_range (in-kernel; reflink on Btrfs/XFS).
+    Windows: kernel32.CopyFileW. Anything else, or a failure before any
+    bytes were copied, falls back to shutil.copyfile.
+    """
+    if hasattr(os, 'copy_file_range'):
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if n == 0:
+                        break
+                    remaining -= n
+            if remaining == 0:
+                return
+        except OSError:
+            pass  # e.g. EXDEV on old kernels, ENOSYS, unsupported filesystem
+    elif sys.platform == 'win32':
+        import ctypes
+        if ctypes.windll.kernel32.CopyFileW(str(src), str(dst), False):
+            return
+    shutil.copyfile(src, dst)
+
+
+def _copy_one(src: Path, dst: Path) -> Path:
+    """Thread-pool worker: copy one H5 file, preserving metadata."""
+    _fast_copy(src, dst)
+    shutil.copystat(src, dst)
+    return dst
 
 
-def check_has_camcal(h5_path: Path) -> bool:
-    """Check if H5 file has lengthPerPixel."""
-    import h5py
-    try:
-        with h5py.File(str(h5_path), 'r') as f:
-            return 'lengthPerPixel' in f
-    except:
-        return False
+def write_lines(lines):
+    """Write status lines with a single stdout write instead of one print each."""
+    text = "\n".join(lines)
+    if text:
+        sys.stdout.write(text + "\n")
+        sys.stdout.flush()
+
+
+def _num_workers(n_items: int) -> int:
+    return max(1, min(os.cpu_count() or 1, n_items))
 
 
 def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Process all GMR61@GMR61 esets')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Revalidate every file, ignoring cached results from earlier runs')
+    args = parser.parse_args()
+    use_cache = not args.no_cache
+    
     print("=" * 70)
     print("BATCH PROCESS ALL GMR61@GMR61 ESETS")
     print("=" * 70)
@@ -63,32 +132,62 @@ def main():
     # Find all esets
     esets = find_all_esets(base_dir)
     print(f"Found {len(esets)} esets:")
-    for eset in esets:
-        print(f"  - {eset.name}")
+    write_lines(f"  - {eset.name}" for eset, _ in esets)
     print()
     
     # Collect all H5 files
     all_h5_files = []
-    for eset in esets:
-        h5_files = find_h5_files(eset)
+    for eset, h5_files in esets:
         all_h5_files.extend(h5_files)
-        print(f"{eset.name}: {len(h5_files)} H5 files")
+    write_lines(f"{eset.name}: {len(h5_files)} H5 files" for eset, h5_files in esets)
     
     print(f"\nTotal: {len(all_h5_files)} H5 files")
     print()
     
+    # Validate every file once; camcal status comes from the same pass.
+    # Unchanged files reuse the outcome cached by a previous run
+    cache = load_cache(CACHE_PATH, CACHE_VERSION) if use_cache else {}
+    keys = {h5_path: cache_key(h5_path) for h5_path in all_h5_files}
+    outcomes = {}
+    for h5_path in all_h5_files:
+        entry = cache.get(keys[h5_path])
+        if entry is not None:
+            errors = [ValidationResult(field, False, message, 'error') for field, message in entry['errors']]
+            outcomes[h5_path] = (entry['passed'], errors, entry['has_camcal'])
+    
+    # Files are independent and h5py serializes calls within a process, so
+    # validate in separate processes
+    to_validate = [h5_path for h5_path in all_h5_files if h5_path not in outcomes]
+    if cache:
+        print(f"Status cache: {len(outcomes)} unchanged, {len(to_validate)} to check\n")
+    if to_validate:
+        with ProcessPoolExecutor(max_workers=_num_workers(len(to_validate))) as ex:
+            for h5_path, outcome in zip(to_validate, ex.map(_validate_one, to_validate)):
+                outcomes[h5_path] = outcome
+    
+    if use_cache:
+        save_cache(CACHE_PATH, CACHE_VERSION, {keys[h5_path]: {
+            'passed': passed,
+            'has_camcal': camcal,
+            'errors': [[r.field, r.message] for r in results if not r.passed and r.severity == 'error'],
+        } for h5_path, (passed, results, camcal) in outcomes.items()})
+    
+    validation_results = [(h5_path, *outcomes[h5_path]) for h5_path in all_h5_files]
+    
     # Check which need camcal
     need_camcal = []
     have_camcal = []
     
     print("--- Checking Camera Calibration Status ---")
-    for h5_path in all_h5_files:
-        if check_has_camcal(h5_path):
+    lines = []
+    for h5_path, _, _, camcal in validation_results:
+        if camcal:
             have_camcal.append(h5_path)
-            print(f"  [OK] {h5_path.name}")
+            lines.append(f"  [OK] {h5_path.name}")
         else:
             need_camcal.append(h5_path)
-            print(f"  [FAIL] {h5_path.name} (needs camcal)")
+            lines.append(f"  [FAIL] {h5_path.name} (needs camcal)")
+    write_lines(lines)
     
     print(f"\nHave camcal: {len(have_camcal)}")
     print(f"Need camcal: {len(need_camcal)}")
@@ -112,8 +211,8 @@ def main():
         print("Run these commands in PowerShell:")
         print()
         
-        for eset_dir in sorted(esets_to_process):
-            print(f'python "D:\\INDYsim\\src\\@matlab_conversion\\append_camcal_to_h5.py" --eset-dir "{eset_dir}"')
+        write_lines(f'python "D:\\INDYsim\\src\\@matlab_conversion\\append_camcal_to_h5.py" --eset-dir "{eset_dir}"'
+                    for eset_dir in sorted(esets_to_process))
         
         print()
         print("After running those, re-run this script to continue.")
@@ -125,25 +224,20 @@ def main():
     print("=" * 70)
     print()
     
-    validation_results = []
-    for h5_path in all_h5_files:
-        print(f"Validating: {h5_path.name}...", end=" ")
-        passed, results = validate_h5_schema(h5_path)
-        validation_results.append((h5_path, passed, results))
-        print("[OK] PASS" if passed else "[FAIL] FAIL")
+    write_lines(f"Validating: {h5_path.name}... {'[OK] PASS' if passed else '[FAIL] FAIL'}"
+                for h5_path, passed, _, _ in validation_results)
     
-    passed_count = sum(1 for _, passed, _ in validation_results if passed)
+    passed_count = sum(1 for _, passed, _, _ in validation_results if passed)
     print(f"\nValidation: {passed_count}/{len(all_h5_files)} passed")
     
     # Show failures
-    failures = [(p, r) for p, passed, r in validation_results if not passed]
+    failures = [(p, r) for p, passed, r, _ in validation_results if not passed]
     if failures:
-        print("\nFailed validations:")
+        lines = ["\nFailed validations:"]
         for h5_path, results in failures:
-            print(f"\n  {h5_path.name}:")
-            for r in results:
-                if not r.passed and r.severity == 'error':
-                    print(f"    - {r.message}")
+            lines.append(f"\n  {h5_path.name}:")
+            lines.extend(f"    - {r.message}" for r in results if not r.passed and r.severity == 'error')
+        write_lines(lines)
         return 1
     
     # Copy to INDYsim
@@ -155,12 +249,13 @@ def main():
     
     output_dir.mkdir(parents=True, exist_ok=True)
     
-    copied = []
-    for h5_path in all_h5_files:
-        dest = output_dir / h5_path.name
-        print(f"Copying: {h5_path.name}...")
-        shutil.copy2(h5_path, dest)
-        copied.append(dest)
+    # Copies are I/O bound (shutil releases the GIL), so threads suffice.
+    # The lines are printed before the pool starts, so they precede any
+    # copy error
+    dests = [output_dir / h5_path.name for h5_path in all_h5_files]
+    write_lines(f"Copying: {h5_path.name}..." for h5_path in all_h5_files)
+    with ThreadPoolExecutor(max_workers=_num_workers(len(all_h5_files))) as ex:
+        copied = list(ex.map(_copy_one, all_h5_files, dests))
     
     print(f"\n[OK] Copied {len(copied)} files to: {output_dir}")
     
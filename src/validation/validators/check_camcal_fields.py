@@ -4,10 +4,44 @@ from pathlib import Path
 
 BASE_DIR = Path(r"D:\rawdata\GMR61@GMR61")
 
+
+def inspect_camcal(h5_file: Path):
+    """
+    Return (has_lpp, camcalinfo field names, has_tri) for one H5 file.
+    
+    Uses the low-level API (link existence + group iteration only); no
+    high-level File/Group objects and no raw-data chunk cache, since no
+    dataset is read.
+    """
+    fapl = h5py.h5p.create(h5py.h5p.FILE_ACCESS)
+    fapl.set_cache(0, 1, 0, 0.75)
+    fid = h5py.h5f.open(str(h5_file).encode(), h5py.h5f.ACC_RDONLY, fapl=fapl)
+    try:
+        root = h5py.h5g.open(fid, b'/')
+        try:
+            has_lpp = root.links.exists(b'lengthPerPixel')
+            fields = []
+            has_tri = False
+            if root.links.exists(b'camcalinfo'):
+                gid = h5py.h5g.open(fid, b'camcalinfo')
+                try:
+                    fields = [name.decode() for name in gid]
+                    has_tri = gid.links.exists(b'tri_points')
+                finally:
+                    gid.close()
+            return has_lpp, fields, has_tri
+        finally:
+            root.close()
+    finally:
+        fid.close()
+
+
 print("=" * 70)
 print("CAMCAL FIELDS CHECK")
 print("=" * 70)
 
+# Scan everything first, then print the report in one write
+rows = []  # (eset name, file name, has_lpp, fields, has_tri); file name None = eset header
 for eset_dir in sorted(BASE_DIR.iterdir()):
     if not eset_dir.is_dir():
         continue
@@ -15,22 +49,20 @@ for eset_dir in sorted(BASE_DIR.iterdir()):
     if not h5_dir.exists():
         continue
     
-    print(f"\n{eset_dir.name}:")
+    rows.append((eset_dir.name, None, False, [], False))
     for h5_file in sorted(h5_dir.glob("*.h5")):
-        with h5py.File(str(h5_file), 'r') as f:
-            has_lpp = 'lengthPerPixel' in f
-            has_camcal = 'camcalinfo' in f
-            
-            fields = []
-            has_tri = False
-            if has_camcal:
-                fields = list(f['camcalinfo'].keys())
-                has_tri = 'tri_points' in f['camcalinfo']
-            
-            status = "[OK]" if (has_lpp and has_camcal and len(fields) >= 4) else "[FAIL]"
-            tri_status = "TRI" if has_tri else "no-tri"
-            print(f"  {status} {h5_file.name}: lpp={has_lpp}, fields={fields}, {tri_status}")
+        rows.append((eset_dir.name, h5_file.name, *inspect_camcal(h5_file)))
+
+lines = []
+for eset_name, name, has_lpp, fields, has_tri in rows:
+    if name is None:
+        lines.append(f"\n{eset_name}:")
+        continue
+    status = "[OK]" if (has_lpp and len(fields) >= 4) else "[FAIL]"
+    tri_status = "TRI" if has_tri else "no-tri"
+    lines.append(f"  {status} {name}: lpp={has_lpp}, fields={fields}, {tri_status}")
+if lines:
+    print("\n".join(lines))
 
 print("\n" + "=" * 70)
 print("DONE")
-
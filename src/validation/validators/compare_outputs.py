@@ -11,14 +11,188 @@ Usage:
     1. Run MATLAB: load_experiment_and_compute.m
     2. Run Python: python load_experiment_and_compute.py
     3. Run this:   python compare_outputs.py
+    Self-test:     python compare_outputs.py --test
+
+Each SpeedRunVel output may also be given as a binary .npy sidecar (same
+stem, (N, 2) float64, Fortran order so each column is one contiguous block).
+It is memory-mapped instead of parsing the CSV, and the comparison reads the
+columns straight from the page cache. The Python script writes one directly;
+for the MATLAB CSV one is written on first load and reused until the CSV is
+newer.
 """
 
+import os
+
 import numpy as np
 import json
 from pathlib import Path
 from datetime import datetime
 from scipy.io import loadmat
 
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+    pa_csv = None
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+# CSVs at least this large are memory-mapped rather than read into a heap
+# buffer, so the page cache holds the text instead of process memory
+LARGE_CSV_BYTES = 200 * 1024 * 1024
+
+_HERE = Path(__file__).resolve().parent
+_TEST_DATA_DIR = _HERE / "test_data"
+_REPORT_PATH = _HERE / "VALIDATION_REPORT.md"
+
+# Rows per chunk when comparing outputs (8 MiB of float64 per scratch buffer)
+COMPARE_CHUNK_ROWS = 1 << 20
+
+
+def load_srv_csv(path):
+    """
+    Load a headerless two-column (time, SpeedRunVel) CSV as a float64 array.
+    
+    Uses Arrow's C tokenizer when pyarrow is installed, then pandas' C
+    engine, falling back to np.loadtxt. Large uncompressed files are parsed
+    straight from a memory map; .csv.gz is decompressed by every reader.
+    """
+    path = str(path)
+    large = not path.endswith('.gz') and os.path.getsize(path) >= LARGE_CSV_BYTES
+    if pa_csv is not None:
+        read_options = pa_csv.ReadOptions(autogenerate_column_names=True)
+        convert_options = pa_csv.ConvertOptions(
+            column_types={'f0': pa.float64(), 'f1': pa.float64()}
+        )
+        if large:
+            # read_csv copies into Arrow buffers, so the map can be closed
+            with pa.memory_map(path) as source:
+                table = pa_csv.read_csv(source, read_options=read_options,
+                                        convert_options=convert_options)
+        else:
+            table = pa_csv.read_csv(path, read_options=read_options,
+                                    convert_options=convert_options)
+        return np.column_stack([col.to_numpy() for col in table.columns])
+    if pd is not None:
+        return pd.read_csv(path, header=None, engine='c', dtype=np.float64,
+                           memory_map=large).to_numpy()
+    return np.loadtxt(path, delimiter=',', ndmin=2)
+
+
+def chunked_diff_stats(reference, test, relative=True, chunk_rows=COMPARE_CHUNK_ROWS):
+    """
+    Absolute and relative difference statistics of test vs reference.
+    
+    Works through the arrays chunk_rows at a time with running max/sum
+    accumulators, so only one chunk-sized scratch buffer is resident even
+    for memory-mapped inputs. The relative difference skips points where
+    |reference| <= 1e-10.
+    
+    Returns:
+        (max_abs, mean_abs, max_rel, mean_rel); the relative values are 0
+        when there are no usable points or relative=False. A NaN in any
+        chunk makes the statistics NaN, so tolerance checks fail.
+    """
+    n = len(reference)
+    buf = np.empty(min(n, chunk_rows))
+    abs_ref = np.empty_like(buf)
+    max_abs = 0.0
+    sum_abs = 0.0
+    max_rel = 0.0
+    sum_rel = 0.0
+    n_rel = 0
+    for start in range(0, n, chunk_rows):
+        ref = reference[start:start + chunk_rows]
+        k = len(ref)
+        d = buf[:k]
+        np.subtract(ref, test[start:start + k], out=d)
+        np.abs(d, out=d)
+        # np.maximum, not max(): max(0.0, nan) is 0.0 and would hide NaN
+        max_abs = np.maximum(max_abs, d.max())
+        sum_abs += d.sum()
+        if not relative:
+            continue
+        
+        a = abs_ref[:k]
+        np.abs(ref, out=a)
+        nonzero_mask = a > 1e-10
+        n_nonzero = np.count_nonzero(nonzero_mask)
+        if n_nonzero:
+            np.divide(d, a, out=d, where=nonzero_mask)
+            max_rel = np.maximum(max_rel, np.max(d, where=nonzero_mask, initial=0.0))
+            sum_rel += np.sum(d, where=nonzero_mask)
+            n_rel += n_nonzero
+    
+    mean_abs = sum_abs / n if n else 0.0
+    mean_rel = sum_rel / n_rel if n_rel else 0.0
+    return float(max_abs), float(mean_abs), float(max_rel), float(mean_rel)
+
+
+def load_srv_output(csv_path: Path):
+    """
+    Load a (time, SpeedRunVel) output, preferring its .npy sidecar.
+    
+    The sidecar is used (memory-mapped, no parsing) when it is at least as
+    new as the CSV. Otherwise the CSV is parsed and the sidecar refreshed.
+    """
+    npy_path = csv_path.with_suffix('.npy')
+    try:
+        npy_mtime = npy_path.stat().st_mtime
+    except OSError:
+        npy_mtime = None
+    if npy_mtime is not None and (not csv_path.exists() or npy_mtime >= csv_path.stat().st_mtime):
+        return np.load(npy_path, mmap_mode='r')
+    
+    data = load_srv_csv(csv_path)
+    try:
+        np.save(npy_path, np.asfortranarray(data))
+    except OSError as e:
+        print(f"  [WARNING] Could not write {npy_path.name}: {e}")
+    return data
+
+
+def load_matlab_reversals(matlab_mat: Path):
+    """
+    Reversal summary from the MATLAB .mat output, or None if it has none.
+    
+    Decoding the whole .mat with loadmat is only needed to pull out three
+    fields, so the result is cached in a matlab_reversals.json sidecar keyed
+    by the .mat's size and mtime; loadmat runs again only when it changes.
+    """
+    sidecar = matlab_mat.with_name("matlab_reversals.json")
+    st = matlab_mat.stat()
+    try:
+        with open(sidecar) as f:
+            cached = json.load(f)
+        if cached.get('source_size') == st.st_size and cached.get('source_mtime_ns') == st.st_mtime_ns:
+            return cached['reversals']
+    except (OSError, ValueError, KeyError):
+        pass
+    
+    reversals = None
+    mat_data = loadmat(str(matlab_mat), simplify_cells=True)
+    if 'validation_data' in mat_data:
+        vd = mat_data['validation_data']
+        if 'outputs' in vd:
+            outputs = vd['outputs']
+            reversals = {
+                'num': int(outputs.get('num_reversals', 0)),
+                'start_times': np.atleast_1d(np.asarray(outputs.get('reversal_start_times', []), dtype=float)).tolist(),
+                'durations': np.atleast_1d(np.asarray(outputs.get('reversal_durations', []), dtype=float)).tolist()
+            }
+    
+    try:
+        with open(sidecar, 'w') as f:
+            json.dump({'source_size': st.st_size, 'source_mtime_ns': st.st_mtime_ns,
+                       'reversals': reversals}, f, indent=2)
+    except OSError as e:
+        print(f"  [WARNING] Could not write {sidecar.name}: {e}")
+    return reversals
+
 
 def main():
     print("=" * 60)
@@ -26,19 +200,19 @@ def main():
     print("=" * 60)
     print()
     
-    test_data_dir = Path(__file__).parent / "test_data"
+    test_data_dir = _TEST_DATA_DIR
     
     # Load MATLAB output
     matlab_csv = test_data_dir / "matlab_speedrunvel.csv"
     matlab_mat = test_data_dir / "matlab_validation_output.mat"
     
-    if not matlab_csv.exists():
+    if not (matlab_csv.exists() or matlab_csv.with_suffix('.npy').exists()):
         print(f"ERROR: MATLAB output not found: {matlab_csv}")
         print("Please run load_experiment_and_compute.m first")
         return 1
     
     print("Loading MATLAB output...")
-    matlab_data = np.loadtxt(matlab_csv, delimiter=',')
+    matlab_data = load_srv_output(matlab_csv)
     matlab_times = matlab_data[:, 0]
     matlab_srv = matlab_data[:, 1]
     print(f"  MATLAB SpeedRunVel: {len(matlab_srv)} values")
@@ -47,28 +221,21 @@ def main():
     # Load additional MATLAB data if available
     matlab_reversals = None
     if matlab_mat.exists():
-        mat_data = loadmat(str(matlab_mat), simplify_cells=True)
-        if 'validation_data' in mat_data:
-            vd = mat_data['validation_data']
-            if 'outputs' in vd:
-                matlab_reversals = {
-                    'num': vd['outputs'].get('num_reversals', 0),
-                    'start_times': vd['outputs'].get('reversal_start_times', []),
-                    'durations': vd['outputs'].get('reversal_durations', [])
-                }
-                print(f"  Reversals: {matlab_reversals['num']}")
+        matlab_reversals = load_matlab_reversals(matlab_mat)
+        if matlab_reversals is not None:
+            print(f"  Reversals: {matlab_reversals['num']}")
     
     # Load Python output
     python_csv = test_data_dir / "python_speedrunvel.csv"
     python_json = test_data_dir / "python_validation_output.json"
     
-    if not python_csv.exists():
+    if not (python_csv.exists() or python_csv.with_suffix('.npy').exists()):
         print(f"\nERROR: Python output not found: {python_csv}")
         print("Please run: python load_experiment_and_compute.py")
         return 1
     
     print("\nLoading Python output...")
-    python_data = np.loadtxt(python_csv, delimiter=',')
+    python_data = load_srv_output(python_csv)
     python_times = python_data[:, 0]
     python_srv = python_data[:, 1]
     print(f"  Python SpeedRunVel: {len(python_srv)} values")
@@ -103,25 +270,12 @@ def main():
         print(f"  Comparing first {min_len} values")
     
     # Compare times
-    time_diff = np.abs(matlab_times - python_times)
-    max_time_diff = time_diff.max()
+    max_time_diff = chunked_diff_stats(matlab_times, python_times, relative=False)[0]
     print(f"\nTime comparison:")
     print(f"  Max time difference: {max_time_diff:.2e} seconds")
     
     # Compare SpeedRunVel
-    srv_diff = np.abs(matlab_srv - python_srv)
-    max_srv_diff = srv_diff.max()
-    mean_srv_diff = srv_diff.mean()
-    
-    # Relative difference (avoid division by zero)
-    nonzero_mask = np.abs(matlab_srv) > 1e-10
-    if np.any(nonzero_mask):
-        rel_diff = srv_diff[nonzero_mask] / np.abs(matlab_srv[nonzero_mask])
-        max_rel_diff = rel_diff.max()
-        mean_rel_diff = rel_diff.mean()
-    else:
-        max_rel_diff = 0
-        mean_rel_diff = 0
+    max_srv_diff, mean_srv_diff, max_rel_diff, mean_rel_diff = chunked_diff_stats(matlab_srv, python_srv)
     
     print(f"\nSpeedRunVel comparison:")
     print(f"  Max absolute difference: {max_srv_diff:.2e}")
@@ -140,16 +294,23 @@ def main():
             print(f"  WARNING: Reversal count mismatch!")
             reversal_match = False
         else:
-            # Compare start times
-            if len(matlab_reversals['start_times']) > 0:
-                for i, (m_start, p_start) in enumerate(zip(
-                    matlab_reversals['start_times'], python_reversals['start_times']
-                )):
-                    diff = abs(m_start - p_start)
-                    status = "OK" if diff < 0.1 else "MISMATCH"
-                    print(f"  Reversal {i+1} start time: MATLAB={m_start:.2f}, Python={p_start:.2f}, diff={diff:.4f} [{status}]")
-                    if diff >= 0.1:
-                        reversal_match = False
+            # Compare start times in one vectorized pass; only mismatches
+            # are listed individually
+            m_starts = np.atleast_1d(np.asarray(matlab_reversals['start_times'], dtype=float)).ravel()
+            p_starts = np.atleast_1d(np.asarray(python_reversals['start_times'], dtype=float)).ravel()
+            n = min(len(m_starts), len(p_starts))
+            if n > 0:
+                m_starts = m_starts[:n]
+                p_starts = p_starts[:n]
+                diffs = np.abs(m_starts - p_starts)
+                bad = ~(diffs < 0.1)
+                n_bad = np.count_nonzero(bad)
+                print(f"  Start times within 0.1 s: {n - n_bad}/{n} "
+                      f"(max diff={diffs.max():.4f}) [{'OK' if n_bad == 0 else 'MISMATCH'}]")
+                for i in np.flatnonzero(bad):
+                    print(f"  Reversal {i+1} start time: MATLAB={m_starts[i]:.2f}, Python={p_starts[i]:.2f}, diff={diffs[i]:.4f} [MISMATCH]")
+                if n_bad:
+                    reversal_match = False
     
     # Determine pass/fail
     TOLERANCE = 1e-6
@@ -167,7 +328,7 @@ def main():
     print(f"\n  OVERALL: {'PASS' if all_passed else 'FAIL'}")
     
     # Generate report
-    report_path = Path(__file__).parent / "VALIDATION_REPORT.md"
+    report_path = _REPORT_PATH
     generate_report(
         report_path,
         matlab_srv, python_srv,
@@ -193,7 +354,8 @@ def generate_report(
     
     experiment = "GMR61@GMR61_T_Re_Sq_50to250PWM_30#C_Bl_7PWM_202506251614"
     
-    report = f"""# Validation Report: MATLAB vs Python Pipeline
+    parts = []
+    parts.append(f"""# Validation Report: MATLAB vs Python Pipeline
 
 **Generated:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 
@@ -224,18 +386,19 @@ def generate_report(
 
 ## Reversal Detection
 
-"""
+""")
     
     if matlab_reversals and python_reversals:
-        report += f"""| Metric | MATLAB | Python |
+        parts.append(f"""| Metric | MATLAB | Python |
 |--------|--------|--------|
 | Number of Reversals | {matlab_reversals['num']} | {python_reversals['num']} |
-"""
+""")
         if matlab_reversals['num'] > 0:
-            report += "\n### Reversal Details\n\n"
-            report += "| Reversal | MATLAB Start (s) | Python Start (s) | MATLAB Duration (s) | Python Duration (s) |\n"
-            report += "|----------|-----------------|-----------------|--------------------|--------------------|"
+            parts.append("\n### Reversal Details\n\n")
+            parts.append("| Reversal | MATLAB Start (s) | Python Start (s) | MATLAB Duration (s) | Python Duration (s) |\n")
+            parts.append("|----------|-----------------|-----------------|--------------------|--------------------|")
             
+            row_parts = []
             for i in range(max(len(matlab_reversals['start_times']), len(python_reversals['start_times']))):
                 m_start = matlab_reversals['start_times'][i] if i < len(matlab_reversals['start_times']) else 'N/A'
                 p_start = python_reversals['start_times'][i] if i < len(python_reversals['start_times']) else 'N/A'
@@ -247,11 +410,12 @@ def generate_report(
                 m_dur_str = f"{m_dur:.2f}" if isinstance(m_dur, (int, float)) else m_dur
                 p_dur_str = f"{p_dur:.2f}" if isinstance(p_dur, (int, float)) else p_dur
                 
-                report += f"\n| {i+1} | {m_start_str} | {p_start_str} | {m_dur_str} | {p_dur_str} |"
+                row_parts.append(f"\n| {i+1} | {m_start_str} | {p_start_str} | {m_dur_str} | {p_dur_str} |")
+            parts.append("".join(row_parts))
     else:
-        report += "Reversal data not available for comparison.\n"
+        parts.append("Reversal data not available for comparison.\n")
     
-    report += f"""
+    parts.append(f"""
 
 ## Methodology
 
@@ -284,10 +448,10 @@ def generate_report(
 
 ## Conclusion
 
-"""
+""")
     
     if all_passed:
-        report += """The Python implementation produces **numerically equivalent** results to the 
+        parts.append("""The Python implementation produces **numerically equivalent** results to the 
 MATLAB reference implementation when processing the same experimental data.
 
 The `engineer_data.py` pipeline has been validated for:
@@ -295,19 +459,42 @@ The `engineer_data.py` pipeline has been validated for:
 - Reverse crawl detection (SpeedRunVel < 0 for >= 3 seconds)
 
 This validation was performed on actual larval tracking data, not synthetic test cases.
-"""
+""")
     else:
-        report += """**VALIDATION FAILED**
+        parts.append("""**VALIDATION FAILED**
 
 The Python implementation does not produce numerically equivalent results.
 Please review the differences above and investigate the source of the discrepancy.
-"""
+""")
+    
+    Path(report_path).write_text("".join(parts), encoding='utf-8')
+
+
+def test_chunked_diff_stats():
+    """Chunked statistics match a whole-array computation; NaN fails."""
+    rng = np.random.default_rng(0)
+    ref = rng.normal(size=1000)
+    test = ref + rng.normal(scale=1e-3, size=1000)
+    max_abs, mean_abs, max_rel, mean_rel = chunked_diff_stats(ref, test, chunk_rows=64)
+    diff = np.abs(ref - test)
+    assert np.isclose(max_abs, diff.max())
+    assert np.isclose(mean_abs, diff.mean())
+    assert np.isclose(max_rel, (diff / np.abs(ref)).max())
+    assert np.isclose(mean_rel, (diff / np.abs(ref)).mean())
     
-    with open(report_path, 'w') as f:
-        f.write(report)
+    # NaN in a later chunk must not be dropped by the running max
+    test[100] = np.nan
+    max_abs, mean_abs, max_rel, mean_rel = chunked_diff_stats(ref, test, chunk_rows=64)
+    assert np.isnan(max_abs) and np.isnan(max_rel)
+    assert not max_abs < 1e-6
+    print("  [OK] chunked_diff_stats")
 
 
 if __name__ == '__main__':
     import sys
+    if '--test' in sys.argv[1:]:
+        test_chunked_diff_stats()
+        print("All tests passed for compare_outputs!")
+        sys.exit(0)
     sys.exit(main())
 
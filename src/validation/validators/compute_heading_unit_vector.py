@@ -39,23 +39,25 @@ def compute_heading_unit_vector(shead: np.ndarray, smid: np.ndarray) -> np.ndarr
     Returns:
         HeadUnitVec: Normalized heading vectors, shape (2, N)
     """
-    # Ensure shape is (2, N)
+    # Ensure shape is (2, N); an (N, 2) input is transposed by the subtract
+    # below as it writes into a C-contiguous (2, N) buffer, so each
+    # coordinate row is contiguous and no separate transpose copy is made
     if shead.shape[0] != 2:
         shead = shead.T
     if smid.shape[0] != 2:
         smid = smid.T
     
     # HeadVec = shead - smid
-    head_vec = shead - smid
+    head_unit_vec = np.empty(np.broadcast_shapes(shead.shape, smid.shape))
+    np.subtract(shead, smid, out=head_unit_vec)
     
-    # Compute norm for each time point
-    norms = np.sqrt(head_vec[0, :]**2 + head_vec[1, :]**2)
+    # Compute norm for each time point (hx*hx + hy*hy, no squared temporaries)
+    norms = np.einsum('ij,ij->j', head_unit_vec, head_unit_vec)
+    np.sqrt(norms, out=norms)
     
-    # Avoid division by zero
-    norms[norms == 0] = 1.0
-    
-    # Normalize: HeadUnitVec = HeadVec / ||HeadVec||
-    head_unit_vec = head_vec / norms
+    # Normalize in place: HeadUnitVec = HeadVec / ||HeadVec||
+    # Zero-norm columns are skipped rather than divided (they are already 0)
+    np.divide(head_unit_vec, norms, out=head_unit_vec, where=norms != 0)
     
     return head_unit_vec
 
@@ -32,19 +32,77 @@ Documentation: scripts/2025-11-24/mason_scripts_documentation.qmd (Section 3)
 MATLAB equivalent: src/validation/reference/compute_speedrunvel.m
 """
 
+import math
+from functools import lru_cache
+
 import numpy as np
 from typing import Tuple
 from compute_heading_unit_vector import compute_heading_unit_vector
 from compute_velocity_and_speed import compute_velocity_and_speed
 
 
+def _make_speedrunvel_loop(prange):
+    """
+    Build the fused SpeedRunVel loop over prange: range for the pure-Python
+    _speedrunvel_loop, numba.prange for the compiled kernel.
+    """
+    def _speedrunvel_loop(shead, smid, xpos, ypos, times, length_per_pixel, out):
+        """
+        Fused per-interval SpeedRunVel: heading, velocity, speed and cos(theta)
+        without intermediate arrays. Operation order mirrors the composed path
+        (compute_heading_unit_vector / compute_velocity_and_speed) so results
+        are identical.
+        """
+        for i in prange(out.size):
+            dx = xpos[i + 1] * length_per_pixel - xpos[i] * length_per_pixel
+            dy = ypos[i + 1] * length_per_pixel - ypos[i] * length_per_pixel
+            dt = times[i + 1] - times[i]
+            distance = math.sqrt(dx * dx + dy * dy)
+            vx = 0.0
+            vy = 0.0
+            if distance > 0:
+                vx = dx / distance
+                vy = dy / distance
+            speed = distance / dt if dt > 0 else 0.0
+        
+            hx = shead[0, i] - smid[0, i]
+            hy = shead[1, i] - smid[1, i]
+            norm = math.sqrt(hx * hx + hy * hy)
+            if norm == 0:
+                norm = 1.0
+            out[i] = speed * (vx * (hx / norm) + vy * (hy / norm))
+    
+    return _speedrunvel_loop
+
+
+_speedrunvel_loop = _make_speedrunvel_loop(range)
+
+
+@lru_cache(maxsize=None)
+def _speedrunvel_kernel():
+    """
+    numba-compiled _speedrunvel_loop, or None without numba.
+    
+    numba is imported on first use rather than at module import, so scripts
+    that only import this module don't pay for it; cache=True reuses the
+    compiled kernel across processes.
+    """
+    try:
+        from numba import njit, prange
+    except ImportError:
+        return None
+    # No fastmath: results are compared against MATLAB at 1e-6
+    return njit(cache=True, parallel=True)(_make_speedrunvel_loop(prange))
+
+
 def compute_speedrunvel(
     shead: np.ndarray,
     smid: np.ndarray,
     xpos: np.ndarray,
     ypos: np.ndarray,
     times: np.ndarray,
-    length_per_pixel: float = 1.0
+    length_per_pixel: float = 1.0,
+    fast_path: bool = True
 ) -> Tuple[np.ndarray, np.ndarray]:
     """
     Compute SpeedRunVel (signed velocity indicating forward/reverse motion).
@@ -61,6 +119,8 @@ def compute_speedrunvel(
         ypos: Y positions in pixels (N,)
         times: Time values (N,)
         length_per_pixel: Conversion factor (cm/pixel)
+        fast_path: Use the fused numba kernel when numba is installed
+            (falls back to the composed computation otherwise)
     
     Returns:
         speedrunvel: Signed velocity array (N-1,)
@@ -71,6 +131,33 @@ def compute_speedrunvel(
     ypos = np.asarray(ypos).ravel()
     times = np.asarray(times).ravel()
     
+    kernel = _speedrunvel_kernel() if fast_path else None
+    if kernel is not None:
+        shead = np.asarray(shead, dtype=np.float64)
+        smid = np.asarray(smid, dtype=np.float64)
+        if shead.shape[0] != 2:
+            shead = shead.T
+        if smid.shape[0] != 2:
+            smid = smid.T
+        # The kernel does no bounds checking, so mismatched inputs must be
+        # rejected here (the composed path raises on them via broadcasting)
+        n_intervals = max(len(times) - 1, 0)
+        if shead.ndim != 2 or shead.shape[0] != 2 or shead.shape[1] < n_intervals:
+            raise ValueError(f"shead shape {shead.shape} does not cover {n_intervals} intervals")
+        if smid.ndim != 2 or smid.shape[0] != 2 or smid.shape[1] < n_intervals:
+            raise ValueError(f"smid shape {smid.shape} does not cover {n_intervals} intervals")
+        if len(xpos) != len(times) or len(ypos) != len(times):
+            raise ValueError(
+                f"xpos/ypos lengths ({len(xpos)}, {len(ypos)}) must match times ({len(times)})"
+            )
+        speedrunvel = np.empty(n_intervals)
+        kernel(shead, smid,
+               xpos.astype(np.float64, copy=False),
+               ypos.astype(np.float64, copy=False),
+               times.astype(np.float64, copy=False),
+               float(length_per_pixel), speedrunvel)
+        return speedrunvel, times[:-1]
+    
     # Convert positions to cm
     xpos_cm = xpos * length_per_pixel
     ypos_cm = ypos * length_per_pixel
@@ -84,11 +171,13 @@ def compute_speedrunvel(
     N = len(times) - 1
     
     # Compute dot product (CosThetaFactor)
-    # Use head_unit_vec at each frame (truncate to match velocity length)
-    cos_theta = np.sum(velocity_vec * head_unit_vec[:, :N], axis=0)
+    # Use head_unit_vec at each frame (truncate to match velocity length);
+    # the slice is a view whose rows stay contiguous, so einsum reads it
+    # in place with no (2, N) product temporary
+    cos_theta = np.einsum('ij,ij->j', velocity_vec, head_unit_vec[:, :N])
     
-    # SpeedRunVel = speed * cos(theta)
-    speedrunvel = speed * cos_theta
+    # SpeedRunVel = speed * cos(theta), reusing the cos_theta buffer
+    speedrunvel = np.multiply(speed, cos_theta, out=cos_theta)
     
     # Times correspond to the first point of each interval
     times_out = times[:-1]
@@ -152,6 +241,20 @@ def test_compute_speedrunvel():
     assert np.max(np.abs(speedrunvel - expected)) < 1e-10, 'Test 4 failed: 45 degree angle'
     print('Test 4 passed: 45 degree angle')
     
+    # Test case 5: too few heading columns is rejected, not read out of bounds
+    shead = np.array([[2, 3], [0, 0]])
+    smid = np.array([[1, 2], [0, 0]])
+    xpos = np.array([0, 1, 2, 3])
+    ypos = np.array([0, 0, 0, 0])
+    times = np.array([0, 1, 2, 3])
+    try:
+        compute_speedrunvel(shead, smid, xpos, ypos, times, length_per_pixel)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('Test 5 failed: short shead/smid should raise ValueError')
+    print('Test 5 passed: shape mismatch rejected')
+    
     print('\nAll tests passed for compute_speedrunvel!')
 
 
@@ -29,10 +29,45 @@ Documentation: scripts/2025-11-24/mason_script_3_reverse_crawl.qmd
 MATLAB equivalent: src/validation/reference/compute_velocity_and_speed.m
 """
 
+import math
+from functools import lru_cache
+
 import numpy as np
 from typing import Tuple
 
 
+def _velocity_speed_loop(xpos, ypos, times, velocity_vec, speed):
+    """Single pass over the track, filling preallocated outputs in place."""
+    for i in range(xpos.size - 1):
+        dx = xpos[i + 1] - xpos[i]
+        dy = ypos[i + 1] - ypos[i]
+        dt = times[i + 1] - times[i]
+        distance = math.sqrt(dx * dx + dy * dy)
+        if distance > 0:
+            velocity_vec[0, i] = dx / distance
+            velocity_vec[1, i] = dy / distance
+        if dt > 0:
+            speed[i] = distance / dt
+
+
+@lru_cache(maxsize=None)
+def _velocity_speed_kernel():
+    """
+    numba-compiled _velocity_speed_loop, or None without numba.
+    
+    numba is imported on first use rather than at module import, so scripts
+    that only import this module don't pay for it; cache=True reuses the
+    compiled kernel across processes.
+    """
+    try:
+        from numba import njit
+    except ImportError:
+        return None
+    # No fastmath: results are compared against MATLAB at 1e-6 and must not
+    # depend on reassociation.
+    return njit(cache=True)(_velocity_speed_loop)
+
+
 def compute_velocity_and_speed(
     xpos: np.ndarray, 
     ypos: np.ndarray, 
@@ -53,29 +88,37 @@ def compute_velocity_and_speed(
         velocity_vec: Normalized velocity vectors, shape (2, N-1)
         speed: Speed values, shape (N-1,)
     """
-    # Ensure 1D arrays
-    xpos = np.asarray(xpos).ravel()
-    ypos = np.asarray(ypos).ravel()
-    times = np.asarray(times).ravel()
-    
-    # Compute displacements
-    dx = np.diff(xpos)
-    dy = np.diff(ypos)
+    # Ensure 1D float64 arrays
+    xpos = np.ascontiguousarray(xpos, dtype=np.float64).ravel()
+    ypos = np.ascontiguousarray(ypos, dtype=np.float64).ravel()
+    times = np.ascontiguousarray(times, dtype=np.float64).ravel()
+    
+    n = max(xpos.size - 1, 0)
+    velocity_vec = np.zeros((2, n))
+    speed = np.zeros(n)
+    
+    kernel = _velocity_speed_kernel()
+    if kernel is not None:
+        # Fused kernel: dx, dy, dt, distance, speed and velocity in one pass
+        kernel(xpos, ypos, times, velocity_vec, speed)
+        return velocity_vec, speed
+    
+    # Compute displacements (dx, dy written straight into the output rows)
+    dx, dy = velocity_vec
+    np.subtract(xpos[1:], xpos[:-1], out=dx)
+    np.subtract(ypos[1:], ypos[:-1], out=dy)
     dt = np.diff(times)
     
     # Compute distance
-    distance = np.sqrt(dx**2 + dy**2)
+    distance = np.sqrt(dx * dx + dy * dy)
     
     # Compute speed (distance / time)
-    speed = np.zeros_like(distance)
-    valid = dt > 0
-    speed[valid] = distance[valid] / dt[valid]
+    np.divide(distance, dt, out=speed, where=dt > 0)
     
-    # Normalize velocity vectors
-    velocity_vec = np.zeros((2, len(dx)))
+    # Normalize velocity vectors in place; zero-length steps stay zero
     valid_dist = distance > 0
-    velocity_vec[0, valid_dist] = dx[valid_dist] / distance[valid_dist]
-    velocity_vec[1, valid_dist] = dy[valid_dist] / distance[valid_dist]
+    np.divide(velocity_vec, distance, out=velocity_vec, where=valid_dist)
+    velocity_vec[:, ~valid_dist] = 0.0
     
     return velocity_vec, speed
 
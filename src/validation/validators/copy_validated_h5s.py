@@ -11,35 +11,104 @@ Creates:
 manifest.json contains:
   - Source paths
   - Validation timestamps
-  - File checksums (MD5)
+  - File checksums (BLAKE3 when the blake3 package is installed, else MD5;
+    --legacy-md5 forces MD5). Each entry stores the digest under the
+    algorithm's name ("blake3" or "md5")
+  - Source size/mtime, so unchanged files are skipped on re-runs (--force
+    copies and hashes everything again)
 """
 
 import sys
 import json
+import argparse
 import shutil
 import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from datetime import datetime
 
+try:
+    import blake3
+except ImportError:
+    blake3 = None
 
-def md5_checksum(file_path: Path) -> str:
-    """Compute MD5 checksum of file."""
-    hash_md5 = hashlib.md5()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+HASH_BUFSIZE = 1 << 20
+COPY_WORKERS = 4
+
+
+def new_hasher(algo: str):
+    """Hash object for 'blake3' (multithreaded for large updates) or 'md5'."""
+    if algo == 'blake3':
+        return blake3.blake3(max_threads=blake3.blake3.AUTO)
+    return hashlib.md5()
+
+
+def copy_and_hash(src_path: Path, dest_path: Path, bufsize: int = HASH_BUFSIZE,
+                  algo: str = 'md5'):
+    """
+    Copy a file and compute its checksum in a single read pass.
+    
+    Each chunk read from src is written to dest and fed to the hash from the
+    same buffer, so the file is read once instead of copy-then-rehash.
+    Metadata is preserved like shutil.copy2. Returns (hexdigest, size_bytes).
+    """
+    hasher = new_hasher(algo)
+    size = 0
+    buf = bytearray(bufsize)
+    mv = memoryview(buf)
+    with open(src_path, "rb") as fsrc, open(dest_path, "wb") as fdst:
+        while True:
+            n = fsrc.readinto(mv)
+            if not n:
+                break
+            fdst.write(mv[:n])
+            hasher.update(mv[:n])
+            size += n
+    shutil.copystat(src_path, dest_path)
+    return hasher.hexdigest(), size
+
+
+def load_previous_manifest(manifest_path: Path) -> dict:
+    """Index an existing manifest's entries by source path (empty if none)."""
+    try:
+        with open(manifest_path) as f:
+            prev = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {e['source_path']: e for e in prev.get('files', []) if 'source_path' in e}
+
+
+def is_unchanged(entry, src_stat, dest_path: Path, algo: str) -> bool:
+    """True if a previous manifest entry still describes src and dest is in place."""
+    if not entry or algo not in entry or entry.get('size_bytes') != src_stat.st_size:
+        return False
+    if entry.get('mtime_ns') != src_stat.st_mtime_ns:
+        return False
+    try:
+        return dest_path.stat().st_size == src_stat.st_size
+    except OSError:
+        return False
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Copy validated H5 files to INDYsim')
+    parser.add_argument('--force', action='store_true',
+                        help='Copy and re-hash every file, ignoring the existing manifest')
+    parser.add_argument('--legacy-md5', action='store_true',
+                        help='Checksum with MD5 even when blake3 is installed')
+    args = parser.parse_args()
+    algo = 'blake3' if blake3 is not None and not args.legacy_md5 else 'md5'
+    
     BASE_DIR = Path(r"D:\rawdata\GMR61@GMR61")
     DEST_DIR = Path(r"D:\INDYsim\data\h5_validated")
+    manifest_path = DEST_DIR / "manifest.json"
     
     print("=" * 70)
     print("COPY VALIDATED H5 FILES TO INDYsim")
     print("=" * 70)
     print(f"Source: {BASE_DIR}")
     print(f"Destination: {DEST_DIR}")
+    print(f"Checksum: {algo}")
     
     # Create destination directory
     DEST_DIR.mkdir(parents=True, exist_ok=True)
@@ -62,42 +131,63 @@ def main():
         "source_base": str(BASE_DIR),
         "destination": str(DEST_DIR),
         "validation_date": "2025-12-04",
+        "hash_algo": algo,
         "files": []
     }
     
-    for eset_name, src_path in h5_files:
-        dest_path = DEST_DIR / src_path.name
-        
-        print(f"Copying: {src_path.name}")
-        print(f"  From: {src_path.parent}")
-        
-        # Copy file
-        shutil.copy2(src_path, dest_path)
-        
-        # Compute checksum
-        checksum = md5_checksum(dest_path)
-        file_size = dest_path.stat().st_size
-        
-        manifest["files"].append({
-            "filename": src_path.name,
-            "eset": eset_name,
-            "source_path": str(src_path),
-            "md5": checksum,
-            "size_bytes": file_size
-        })
-        
-        print(f"  Size: {file_size / 1024 / 1024:.2f} MB")
-        print(f"  MD5: {checksum}")
+    # Reuse checksums for files whose source size/mtime match the previous
+    # manifest and whose copy is already in place
+    prev_index = {} if args.force else load_previous_manifest(manifest_path)
+    entries = [None] * len(h5_files)
+    to_copy = []
+    for i, (eset_name, src_path) in enumerate(h5_files):
+        src_stat = src_path.stat()
+        prev = prev_index.get(str(src_path))
+        if is_unchanged(prev, src_stat, DEST_DIR / src_path.name, algo):
+            entries[i] = {**prev, "eset": eset_name}
+        else:
+            to_copy.append((i, src_stat))
+    if prev_index:
+        print(f"Unchanged since last manifest: {len(h5_files) - len(to_copy)}, to copy: {len(to_copy)}\n")
+    
+    # Copies and checksums release the GIL, so overlap them across files.
+    # Status is printed as each file finishes; entries are stored by input
+    # index (only this thread touches them), keeping the manifest deterministic
+    if to_copy:
+        with ThreadPoolExecutor(max_workers=min(COPY_WORKERS, len(to_copy))) as ex:
+            futures = {}
+            for i, src_stat in to_copy:
+                src_path = h5_files[i][1]
+                futures[ex.submit(copy_and_hash, src_path, DEST_DIR / src_path.name,
+                                  algo=algo)] = (i, src_stat)
+            for fut in as_completed(futures):
+                i, src_stat = futures[fut]
+                eset_name, src_path = h5_files[i]
+                checksum, file_size = fut.result()
+                
+                entries[i] = {
+                    "filename": src_path.name,
+                    "eset": eset_name,
+                    "source_path": str(src_path),
+                    algo: checksum,
+                    "size_bytes": file_size,
+                    "mtime_ns": src_stat.st_mtime_ns
+                }
+                
+                print(f"Copied: {src_path.name}")
+                print(f"  From: {src_path.parent}")
+                print(f"  Size: {file_size / 1024 / 1024:.2f} MB")
+                print(f"  {algo.upper()}: {checksum}")
+    manifest["files"] = entries
     
     # Write manifest
-    manifest_path = DEST_DIR / "manifest.json"
     with open(manifest_path, 'w') as f:
         json.dump(manifest, f, indent=2)
     
     print(f"\n{'=' * 70}")
     print("COPY COMPLETE")
     print(f"{'=' * 70}")
-    print(f"Files copied: {len(h5_files)}")
+    print(f"Files copied: {len(to_copy)} ({len(h5_files) - len(to_copy)} unchanged)")
     print(f"Manifest: {manifest_path}")
     print(f"Destination: {DEST_DIR}")
     
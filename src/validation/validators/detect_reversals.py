@@ -22,8 +22,20 @@ MATLAB equivalent: src/validation/reference/detect_reversals.m
 """
 
 import numpy as np
-from typing import List, Dict
+from functools import lru_cache
 from dataclasses import dataclass
+from typing import List, Tuple
+from rate_from_time_corrected import _bin_edges, rate_from_time_corrected
+
+# Field layout of the record array returned by detect_reversals
+REVERSAL_DTYPE = np.dtype([
+    ('start_idx', 'i8'),
+    ('end_idx', 'i8'),
+    ('start_time', 'f8'),
+    ('end_time', 'f8'),
+    ('duration', 'f8'),
+    ('mean_speed', 'f8'),
+])
 
 
 @dataclass
@@ -36,6 +48,11 @@ class Reversal:
     duration: float
     mean_speed: float = 0.0
     
+    @classmethod
+    def from_record(cls, rec) -> 'Reversal':
+        """Build a Reversal from one row of detect_reversals' output."""
+        return cls(**{name: rec[name].item() for name in REVERSAL_DTYPE.names})
+    
     def to_dict(self) -> dict:
         return {
             'start_idx': self.start_idx,
@@ -47,11 +64,208 @@ class Reversal:
         }
 
 
+def _detect_reversals_core(times, speedrunvel, min_duration):
+    """
+    Single-pass scan for negative runs lasting at least min_duration.
+    
+    Returns (starts, ends, durations) for the kept runs, with ends
+    exclusive. Same timing rules as the vectorized path in detect_reversals,
+    but no N-sized mask is allocated.
+    """
+    n = speedrunvel.size
+    cap = n // 2 + 1  # runs alternate with non-negative samples
+    starts = np.empty(cap, np.int64)
+    ends = np.empty(cap, np.int64)
+    durations = np.empty(cap, np.float64)
+    n_events = 0
+    start = -1
+    for i in range(n + 1):
+        is_negative = i < n and speedrunvel[i] < 0
+        if is_negative:
+            if start < 0:
+                start = i
+        elif start >= 0:
+            duration = times[min(i, n - 1)] - times[start]
+            if duration >= min_duration:
+                starts[n_events] = start
+                ends[n_events] = i
+                durations[n_events] = duration
+                n_events += 1
+            start = -1
+    return starts[:n_events], ends[:n_events], durations[:n_events]
+
+
+@lru_cache(maxsize=None)
+def _reversals_kernel():
+    """
+    numba-compiled _detect_reversals_core, or None without numba.
+    
+    Imported and compiled on first use; cache=True keeps the compiled scan
+    across processes. No fastmath, so NaN samples still count as
+    non-negative.
+    """
+    try:
+        from numba import njit
+    except ImportError:
+        return None
+    return njit(cache=True)(_detect_reversals_core)
+
+
+def _reversal_counts_core(times, speedrunvel, min_duration, edges, counts):
+    """
+    Fused detect + bin: the _detect_reversals_core scan, but each kept
+    reversal increments the count of the bin holding its start time
+    instead of being stored.
+    
+    Bins follow rate_from_time_corrected: [edges[k], edges[k+1]), the last
+    one closed; start times outside [edges[0], edges[-1]] or NaN are not
+    counted.
+    """
+    n = speedrunvel.size
+    n_bins = counts.size
+    last_edge = edges[n_bins]
+    start = -1
+    for i in range(n + 1):
+        is_negative = i < n and speedrunvel[i] < 0
+        if is_negative:
+            if start < 0:
+                start = i
+        elif start >= 0:
+            if times[min(i, n - 1)] - times[start] >= min_duration:
+                t = times[start]
+                if t >= edges[0] and t <= last_edge:
+                    # Guess from the quotient, then settle against the
+                    # actual edges so boundary times bin like np.histogram
+                    k = min(int(t / edges[1]), n_bins - 1)
+                    while k > 0 and t < edges[k]:
+                        k -= 1
+                    while k < n_bins - 1 and t >= edges[k + 1]:
+                        k += 1
+                    counts[k] += 1
+            start = -1
+
+
+@lru_cache(maxsize=None)
+def _reversal_counts_kernel():
+    """numba-compiled _reversal_counts_core, or None without numba."""
+    try:
+        from numba import njit
+    except ImportError:
+        return None
+    return njit(cache=True)(_reversal_counts_core)
+
+
+def _make_all_reversals_core(prange):
+    """
+    Build _detect_all_reversals_core over prange: range for the pure-Python
+    version, numba.prange for the parallel kernel.
+    """
+    def _detect_all_reversals_core(times, speedrunvel, offsets, min_duration,
+                                   starts, ends, durations, n_events):
+        """
+        _detect_reversals_core over every track of a ragged layout: track t is
+        times/speedrunvel[offsets[t]:offsets[t + 1]], indices stay global.
+        
+        Track t writes its runs into its own scratch slots starting at
+        offsets[t] + t (hi - lo + 1 slots, more than a track can fill), so
+        tracks can be scanned in parallel; n_events[t] is how many it wrote.
+        """
+        for t in prange(offsets.size - 1):
+            lo = offsets[t]
+            hi = offsets[t + 1]
+            base = lo + t
+            count = 0
+            start = -1
+            for i in range(lo, hi + 1):
+                is_negative = i < hi and speedrunvel[i] < 0
+                if is_negative:
+                    if start < 0:
+                        start = i
+                elif start >= 0:
+                    duration = times[min(i, hi - 1)] - times[start]
+                    if duration >= min_duration:
+                        starts[base + count] = start
+                        ends[base + count] = i
+                        durations[base + count] = duration
+                        count += 1
+                    start = -1
+            n_events[t] = count
+    
+    return _detect_all_reversals_core
+
+
+_detect_all_reversals_core = _make_all_reversals_core(range)
+
+
+@lru_cache(maxsize=None)
+def _all_reversals_kernel():
+    """numba-compiled _detect_all_reversals_core (parallel over tracks), or None."""
+    try:
+        from numba import njit, prange
+    except ImportError:
+        return None
+    return njit(cache=True, parallel=True)(_make_all_reversals_core(prange))
+
+
+def _reversal_runs(times, speedrunvel, min_duration):
+    """
+    (starts, exclusive ends, durations) of the negative runs lasting at
+    least min_duration, from the compiled scan or its numpy equivalent.
+    """
+    kernel = _reversals_kernel()
+    if kernel is not None:
+        # Compiled scan: one streaming pass, no N-sized mask
+        starts, ends, durations = kernel(times, speedrunvel, float(min_duration))
+    else:
+        # Run-length encode the negative mask: padding with False on both
+        # sides makes every run produce a +1 (start) and a -1 (exclusive end)
+        n = len(speedrunvel)
+        negative = np.zeros(n + 2, dtype=bool)
+        np.less(speedrunvel, 0, out=negative[1:-1])
+        edges = np.diff(negative.view(np.int8))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        
+        # A reversal ended by a non-negative sample is timed up to that
+        # sample; one running to the end of data is timed up to the last one
+        durations = times[np.minimum(ends, n - 1)] - times[starts]
+        keep = durations >= min_duration
+        starts, ends, durations = starts[keep], ends[keep], durations[keep]
+    return starts, ends, durations
+
+
+def _reversal_records(times, speedrunvel, starts, ends, durations, origin=0):
+    """
+    Record array for runs [starts, ends) of speedrunvel; origin is
+    subtracted from the stored indices (the track offset in a ragged layout).
+    """
+    if len(starts) == 0:
+        return np.recarray(0, dtype=REVERSAL_DTYPE)
+    
+    # Mean speed of every event from one reduceat over interleaved
+    # [start, end) boundaries; the even slots hold the per-event sums. An
+    # end at len(speedrunvel) is dropped since reduceat runs to the end anyway
+    boundaries = np.empty(2 * len(starts), dtype=np.intp)
+    boundaries[0::2] = starts
+    boundaries[1::2] = ends
+    if boundaries[-1] == len(speedrunvel):
+        boundaries = boundaries[:-1]
+    sums = np.add.reduceat(speedrunvel, boundaries)[0::2]
+    mean_speeds = np.abs(sums / (ends - starts))
+    
+    # One column per field; no per-event Python objects
+    end_idx = ends - 1
+    return np.rec.fromarrays(
+        [starts - origin, end_idx - origin, times[starts], times[end_idx],
+         durations, mean_speeds],
+        dtype=REVERSAL_DTYPE)
+
+
 def detect_reversals(
     times: np.ndarray,
     speedrunvel: np.ndarray,
     min_duration: float = 3.0
-) -> List[Reversal]:
+) -> np.recarray:
     """
     Detect reverse crawl events from SpeedRunVel time series.
     
@@ -59,65 +273,143 @@ def detect_reversals(
     lasting at least min_duration seconds.
     
     Args:
-        times: Time array
-        speedrunvel: Signed velocity array
+        times: Time array (flattened to contiguous float64)
+        speedrunvel: Signed velocity array (flattened to contiguous float64)
         min_duration: Minimum duration for reversal (seconds)
     
     Returns:
-        List of Reversal objects
+        Record array of REVERSAL_DTYPE, one row per reversal (fields are
+        also reachable as attributes, e.g. reversals.duration); use
+        Reversal.from_record for a single event object
     """
-    times = np.asarray(times).ravel()
-    speedrunvel = np.asarray(speedrunvel).ravel()
+    # One conversion up front; a no-op for the contiguous float64 arrays
+    # the pipeline passes, and the layout the compiled scan is typed for
+    times = np.ascontiguousarray(times, dtype=np.float64).reshape(-1)
+    speedrunvel = np.ascontiguousarray(speedrunvel, dtype=np.float64).reshape(-1)
     
     if len(times) == 0 or len(speedrunvel) == 0:
-        return []
+        return np.recarray(0, dtype=REVERSAL_DTYPE)
     
-    reversals = []
-    in_reversal = False
-    start_idx = None
-    start_time = None
+    starts, ends, durations = _reversal_runs(times, speedrunvel, min_duration)
     
-    for i in range(len(speedrunvel)):
-        is_negative = speedrunvel[i] < 0
-        
-        if is_negative and not in_reversal:
-            # Start of reversal
-            in_reversal = True
-            start_idx = i
-            start_time = times[i]
+    return _reversal_records(times, speedrunvel, starts, ends, durations)
+
+
+def detect_all_reversals(
+    times: np.ndarray,
+    speedrunvel: np.ndarray,
+    offsets: np.ndarray,
+    min_duration: float = 3.0
+) -> List[np.recarray]:
+    """
+    detect_reversals for many tracks at once.
+    
+    Tracks are passed concatenated (ragged layout): track t is
+    times[offsets[t]:offsets[t + 1]] and likewise for speedrunvel, e.g.
+    offsets = np.concatenate([[0], np.cumsum([len(s) for s in tracks])]).
+    With numba the tracks are scanned in parallel threads.
+    
+    Args:
+        times: Concatenated time arrays
+        speedrunvel: Concatenated signed velocity arrays
+        offsets: Track boundaries, length n_tracks + 1, starting at 0
+        min_duration: Minimum duration for reversal (seconds)
+    
+    Returns:
+        One record array per track, each equal to what detect_reversals
+        returns for that track alone (indices are track-local)
+    """
+    times = np.ascontiguousarray(times, dtype=np.float64).reshape(-1)
+    speedrunvel = np.ascontiguousarray(speedrunvel, dtype=np.float64).reshape(-1)
+    offsets = np.ascontiguousarray(offsets, dtype=np.int64).reshape(-1)
+    n_tracks = offsets.size - 1
+    if n_tracks < 1:
+        return []
+    
+    kernel = _all_reversals_kernel()
+    if kernel is not None:
+        scratch = offsets[-1] + n_tracks
+        starts = np.empty(scratch, np.int64)
+        ends = np.empty(scratch, np.int64)
+        durations = np.empty(scratch, np.float64)
+        n_events = np.empty(n_tracks, np.int64)
+        kernel(times, speedrunvel, offsets, float(min_duration),
+               starts, ends, durations, n_events)
         
-        elif not is_negative and in_reversal:
-            # End of reversal
-            in_reversal = False
-            if start_idx is not None:
-                duration = times[i] - start_time
-                if duration >= min_duration:
-                    mean_speed = np.abs(np.mean(speedrunvel[start_idx:i]))
-                    reversals.append(Reversal(
-                        start_idx=start_idx,
-                        end_idx=i - 1,
-                        start_time=start_time,
-                        end_time=times[i - 1],
-                        duration=duration,
-                        mean_speed=mean_speed
-                    ))
-            start_idx = None
-    
-    # Handle reversal extending to end of data
-    if in_reversal and start_idx is not None:
-        duration = times[-1] - start_time
-        if duration >= min_duration:
-            mean_speed = np.abs(np.mean(speedrunvel[start_idx:]))
-            reversals.append(Reversal(
-                start_idx=start_idx,
-                end_idx=len(speedrunvel) - 1,
-                start_time=start_time,
-                end_time=times[-1],
-                duration=duration,
-                mean_speed=mean_speed
-            ))
-    
-    return reversals
+        # Compact each track's filled slots, in track order
+        first = np.cumsum(n_events) - n_events
+        event_track = np.repeat(np.arange(n_tracks), n_events)
+        slots = (offsets[:-1] + np.arange(n_tracks))[event_track] + \
+            np.arange(event_track.size) - first[event_track]
+        starts, ends, durations = starts[slots], ends[slots], durations[slots]
+    else:
+        runs = [_reversal_runs(times[lo:hi], speedrunvel[lo:hi], min_duration)
+                for lo, hi in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+        n_events = np.array([len(r[0]) for r in runs], dtype=np.int64)
+        event_track = np.repeat(np.arange(n_tracks), n_events)
+        if runs:
+            starts = np.concatenate([r[0] for r in runs]) + offsets[event_track]
+            ends = np.concatenate([r[1] for r in runs]) + offsets[event_track]
+            durations = np.concatenate([r[2] for r in runs])
+        else:
+            starts = ends = np.empty(0, np.int64)
+            durations = np.empty(0)
+    
+    # Runs never cross track boundaries, so one assembly over the
+    # concatenated arrays serves every track; then split back per track
+    records = _reversal_records(times, speedrunvel, starts, ends, durations,
+                                origin=offsets[event_track])
+    return np.split(records, np.cumsum(n_events)[:-1])
+
+
+def reversal_rate(
+    times: np.ndarray,
+    speedrunvel: np.ndarray,
+    min_duration: float,
+    bin_size: float,
+    total_duration: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Reversal start rate per bin, without building the reversal records.
+    
+    Same result as
+        rate_from_time_corrected(detect_reversals(times, speedrunvel,
+                                 min_duration).start_time,
+                                 total_duration, bin_size)
+    With numba, one compiled pass over speedrunvel detects the reversals
+    and bins their start times together.
+    
+    Args:
+        times: Time array
+        speedrunvel: Signed velocity array
+        min_duration: Minimum duration for reversal (seconds)
+        bin_size: Size of each time bin (seconds)
+        total_duration: Total observation duration (seconds)
+    
+    Returns:
+        rate: Reversal starts per second in each bin
+        time_bins: Center of each time bin
+        counts: Raw reversal starts per bin
+    """
+    times = np.ascontiguousarray(times, dtype=np.float64).reshape(-1)
+    speedrunvel = np.ascontiguousarray(speedrunvel, dtype=np.float64).reshape(-1)
+    
+    edges = _bin_edges(float(total_duration), float(bin_size))
+    n_bins = edges.size - 1
+    if len(times) == 0 or len(speedrunvel) == 0 or n_bins < 1:
+        return rate_from_time_corrected(np.empty(0), total_duration, bin_size)
+    
+    kernel = _reversal_counts_kernel()
+    if kernel is None:
+        # Start times come out of the scan in order
+        starts, _, _ = _reversal_runs(times, speedrunvel, min_duration)
+        return rate_from_time_corrected(times[starts], total_duration, bin_size,
+                                        presorted=True)
+    
+    counts = np.zeros(n_bins, dtype=np.int64)
+    kernel(times, speedrunvel, float(min_duration), edges, counts)
+    time_bins = np.arange(n_bins) * bin_size + bin_size / 2
+    return counts / bin_size, time_bins, counts
 
 
 def test_detect_reversals():
@@ -174,6 +466,38 @@ def test_detect_reversals():
     assert len(reversals) == 1, 'Test 5 failed: should detect reversal at end'
     print('Test 5 passed: reversal at end of data')
     
+    # Test case 6: Fused reversal rate matches detect + rate_from_time_corrected
+    times = np.arange(0, 20.1, 0.1)
+    speedrunvel = np.ones(len(times))
+    speedrunvel[10:51] = -1
+    speedrunvel[100:151] = -1
+    
+    rate, _, counts = reversal_rate(times, speedrunvel, 3.0, 5.0, 20.0)
+    expected_rate, _, expected_counts = rate_from_time_corrected(
+        detect_reversals(times, speedrunvel, 3.0).start_time, 20.0, 5.0)
+    
+    assert np.array_equal(counts, expected_counts), 'Test 6 failed: counts should match'
+    assert np.array_equal(rate, expected_rate), 'Test 6 failed: rates should match'
+    print('Test 6 passed: fused reversal rate')
+    
+    # Test case 7: Ragged multi-track detection matches per-track calls
+    times = np.arange(0, 20.1, 0.1)
+    track_a = np.ones(len(times))
+    track_a[10:51] = -1
+    track_b = np.ones(len(times))
+    track_b[100:] = -1  # Reversal running to the end of the track
+    offsets = np.array([0, len(times), 2 * len(times)])
+    
+    per_track = detect_all_reversals(np.concatenate([times, times]),
+                                     np.concatenate([track_a, track_b]), offsets, 3.0)
+    
+    assert len(per_track) == 2, 'Test 7 failed: should return one array per track'
+    for speeds, found in zip([track_a, track_b], per_track):
+        expected = detect_reversals(times, speeds, 3.0)
+        assert np.array_equal(found.start_idx, expected.start_idx), 'Test 7 failed: start indices should be track-local'
+        assert np.array_equal(found.duration, expected.duration), 'Test 7 failed: durations should match'
+    print('Test 7 passed: multi-track detection')
+    
     print('\nAll tests passed for detect_reversals!')
 
 
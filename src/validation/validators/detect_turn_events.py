@@ -20,11 +20,22 @@ Documentation: scripts/2025-11-24/mason_script_4_behavior_analysis.qmd
 MATLAB equivalent: src/validation/reference/detect_turn_events.m
 """
 
+import math
+from functools import lru_cache
+
 import numpy as np
-from typing import List
 from dataclasses import dataclass
 
 
+# Field layout of the record array returned by detect_turn_events
+TURN_EVENT_DTYPE = np.dtype([
+    ('idx', 'i8'),
+    ('time', 'f8'),
+    ('angle_change', 'f8'),  # in degrees
+    ('direction_code', 'i1'),  # +1 left, -1 right
+])
+
+
 @dataclass
 class TurnEvent:
     """Represents a turn/reorientation event."""
@@ -33,6 +44,16 @@ class TurnEvent:
     angle_change: float  # in degrees
     direction: str  # 'left' or 'right'
     
+    @classmethod
+    def from_record(cls, rec) -> 'TurnEvent':
+        """Build a TurnEvent from one row of detect_turn_events' output."""
+        return cls(
+            idx=rec['idx'].item(),
+            time=rec['time'].item(),
+            angle_change=rec['angle_change'].item(),
+            direction='left' if rec['direction_code'] > 0 else 'right'
+        )
+    
     def to_dict(self) -> dict:
         return {
             'idx': self.idx,
@@ -42,12 +63,62 @@ class TurnEvent:
         }
 
 
+MAX_WINDOW = 30  # Maximum frames to look ahead
+
+
+def _detect_turn_core(angle_diff_deg, angle_threshold, min_frames, max_window):
+    """
+    Scalar turn scan: per start frame, accumulate heading change until it
+    crosses the threshold, then skip ahead min_frames past the crossing.
+    
+    Returns (idxs, angle_changes, dir_flags) with dir_flags +1 for left,
+    -1 for right.
+    """
+    n_diff = angle_diff_deg.size
+    idxs = np.empty(n_diff, np.int64)
+    angles = np.empty(n_diff, np.float64)
+    dir_flags = np.empty(n_diff, np.int8)
+    n_events = 0
+    i = 0
+    while i < n_diff - min_frames:
+        cumsum_angle = 0.0
+        found = False
+        for j in range(i, min(i + max_window, n_diff)):
+            cumsum_angle += angle_diff_deg[j]
+            if math.fabs(cumsum_angle) >= angle_threshold:
+                idxs[n_events] = i
+                angles[n_events] = math.fabs(cumsum_angle)
+                dir_flags[n_events] = 1 if cumsum_angle > 0 else -1
+                n_events += 1
+                i = j + min_frames  # Skip ahead to avoid double-counting
+                found = True
+                break
+        if not found:
+            i += 1
+    return idxs[:n_events], angles[:n_events], dir_flags[:n_events]
+
+
+@lru_cache(maxsize=None)
+def _turn_kernel():
+    """
+    numba-compiled _detect_turn_core, or None without numba.
+    
+    Imported and compiled on first use; cache=True keeps the compiled scan
+    across processes. No fastmath, so NaN steps still never cross.
+    """
+    try:
+        from numba import njit
+    except ImportError:
+        return None
+    return njit(cache=True)(_detect_turn_core)
+
+
 def detect_turn_events(
     times: np.ndarray,
     head_unit_vec: np.ndarray,
     angle_threshold: float = 45.0,
     min_frames: int = 3
-) -> List[TurnEvent]:
+) -> np.recarray:
     """
     Detect turn/reorientation events from heading angle changes.
     
@@ -55,60 +126,108 @@ def detect_turn_events(
     exceeds the threshold within a window.
     
     Args:
-        times: Time array
-        head_unit_vec: Normalized heading vectors (2, N)
+        times: Time array (flattened to contiguous float64)
+        head_unit_vec: Normalized heading vectors, (2, N) C-contiguous
+            float64; other layouts, including (N, 2), are copied into it
         angle_threshold: Minimum angle change (degrees)
         min_frames: Minimum frames between detected turns
     
     Returns:
-        List of TurnEvent objects
+        Record array of TURN_EVENT_DTYPE, one row per turn (fields are
+        also reachable as attributes, e.g. turn_events.angle_change); use
+        TurnEvent.from_record for a single event object
     """
-    times = np.asarray(times).ravel()
-    
-    if head_unit_vec.shape[0] != 2:
-        head_unit_vec = head_unit_vec.T
+    # One conversion up front; a no-op for what compute_heading_unit_vector
+    # returns. Contiguous rows keep arctan2 on unit-stride data
+    times = np.ascontiguousarray(times, dtype=np.float64).reshape(-1)
+    head = np.ascontiguousarray(head_unit_vec, dtype=np.float64)
+    if head.shape[0] != 2:
+        head = np.ascontiguousarray(head.T)
     
-    if head_unit_vec.shape[1] < min_frames:
-        return []
+    if head.shape[1] < min_frames:
+        return np.recarray(0, dtype=TURN_EVENT_DTYPE)
     
     # Compute heading angles (radians)
-    angles = np.arctan2(head_unit_vec[1, :], head_unit_vec[0, :])
+    angles = np.arctan2(head[1], head[0])
     
-    # Unwrap angles to handle -pi to pi discontinuity
-    angles_unwrapped = np.unwrap(angles)
+    # Per-step angle change, wrapped across the -pi/pi discontinuity the way
+    # np.unwrap does it, without building the unwrapped series: steps with
+    # |d| < pi are kept as-is, larger ones are wrapped into [-pi, pi]
+    angle_diff = np.diff(angles)
+    jumps = np.flatnonzero(~(np.abs(angle_diff) < np.pi))
+    if jumps.size:
+        d = angle_diff[jumps]
+        wrapped = np.mod(d + np.pi, 2 * np.pi) - np.pi
+        wrapped[(wrapped == -np.pi) & (d > 0)] = np.pi
+        angle_diff[jumps] = wrapped
     
-    # Compute angle changes (radians to degrees)
-    angle_diff = np.diff(angles_unwrapped)
-    angle_diff_deg = np.rad2deg(angle_diff)
+    # Radians to degrees, in place
+    angle_diff_deg = np.rad2deg(angle_diff, out=angle_diff)
     
-    turn_events = []
-    i = 0
-    max_window = 30  # Maximum frames to look ahead
+    max_window = MAX_WINDOW
     
-    while i < len(angle_diff) - min_frames:
-        # Look for cumulative angle change exceeding threshold
-        cumsum_angle = 0.0
-        found = False
-        
-        for j in range(i, min(i + max_window, len(angle_diff))):
-            cumsum_angle += angle_diff_deg[j]
-            
-            if abs(cumsum_angle) >= angle_threshold:
-                direction = 'left' if cumsum_angle > 0 else 'right'
-                turn_events.append(TurnEvent(
-                    idx=i,
-                    time=times[i],
-                    angle_change=abs(cumsum_angle),
-                    direction=direction
-                ))
-                i = j + min_frames  # Skip ahead to avoid double-counting
-                found = True
-                break
-        
-        if not found:
-            i += 1
+    kernel = _turn_kernel()
+    if kernel is not None:
+        # Compiled scalar scan; directions come back as int8 codes
+        idxs, angle_changes, dir_flags = kernel(
+            angle_diff_deg, float(angle_threshold), int(min_frames), max_window)
+        return _turn_records(times, idxs, angle_changes, dir_flags)
+    
+    n_diff = len(angle_diff_deg)
+    limit = n_diff - min_frames
+    if limit <= 0:
+        return np.recarray(0, dtype=TURN_EVENT_DTYPE)
     
-    return turn_events
+    # Prefix sums: the cumulative change over angle_diff_deg[i..j] is
+    # cs[j+1] - cs[i], so no window is re-accumulated per start frame.
+    # NaN padding past the end makes truncated windows never cross.
+    cs = np.full(n_diff + 1 + max_window, np.nan)
+    cs[0] = 0.0
+    nan_diff = np.isnan(angle_diff_deg)
+    has_nan = nan_diff.any()
+    if has_nan:
+        # A NaN only poisons windows that contain it (as in a per-window
+        # sum); keep it out of the prefix and track NaN counts instead
+        np.cumsum(np.where(nan_diff, 0.0, angle_diff_deg), out=cs[1:n_diff + 1])
+        nan_cs = np.zeros(n_diff + 1 + max_window, dtype=np.int64)
+        np.cumsum(nan_diff, out=nan_cs[1:n_diff + 1])
+        nan_windows = np.lib.stride_tricks.sliding_window_view(nan_cs[1:], max_window)
+    else:
+        np.cumsum(angle_diff_deg, out=cs[1:n_diff + 1])
+    windows = np.lib.stride_tricks.sliding_window_view(cs[1:], max_window)
+    
+    # First crossing for every candidate start frame, in row blocks to bound
+    # the (rows, max_window) temporaries
+    first_hit = np.full(limit, -1, dtype=np.int64)
+    block = 1 << 15
+    for lo in range(0, limit, block):
+        hi = min(lo + block, limit)
+        crossed = np.abs(windows[lo:hi] - cs[lo:hi, None]) >= angle_threshold
+        if has_nan:
+            crossed &= nan_windows[lo:hi] == nan_cs[lo:hi, None]
+        has_hit = crossed.any(axis=1)
+        first_hit[lo:hi][has_hit] = crossed[has_hit].argmax(axis=1)
+    
+    # Greedy scan with skip-ahead only visits start frames that cross
+    idxs = []
+    next_i = 0
+    for i in np.flatnonzero(first_hit >= 0).tolist():
+        if i < next_i:
+            continue
+        idxs.append(i)
+        next_i = i + first_hit[i] + min_frames  # Skip ahead to avoid double-counting
+    
+    idxs = np.array(idxs, dtype=np.int64)
+    cumsum_angle = cs[idxs + first_hit[idxs] + 1] - cs[idxs]
+    dir_flags = np.where(cumsum_angle > 0, 1, -1).astype(np.int8)
+    return _turn_records(times, idxs, np.abs(cumsum_angle), dir_flags)
+
+
+def _turn_records(times, idxs, angle_changes, dir_flags) -> np.recarray:
+    """Assemble detect_turn_events' record array from per-event columns."""
+    return np.rec.fromarrays(
+        [idxs, times[idxs], angle_changes, dir_flags],
+        dtype=TURN_EVENT_DTYPE)
 
 
 def test_detect_turn_events():
@@ -140,7 +259,7 @@ def test_detect_turn_events():
     turn_events = detect_turn_events(times, head_unit_vec, 45.0)
     
     assert len(turn_events) >= 1, 'Test 2 failed: should detect turn'
-    assert turn_events[0].direction == 'left', 'Test 2 failed: should be left turn'
+    assert TurnEvent.from_record(turn_events[0]).direction == 'left', 'Test 2 failed: should be left turn'
     print('Test 2 passed: single left turn')
     
     # Test case 3: Single 90 degree right turn
@@ -159,7 +278,7 @@ def test_detect_turn_events():
     turn_events = detect_turn_events(times, head_unit_vec, 45.0)
     
     assert len(turn_events) >= 1, 'Test 3 failed: should detect turn'
-    assert turn_events[0].direction == 'right', 'Test 3 failed: should be right turn'
+    assert TurnEvent.from_record(turn_events[0]).direction == 'right', 'Test 3 failed: should be right turn'
     print('Test 3 passed: single right turn')
     
     # Test case 4: Small turn below threshold
@@ -11,41 +11,64 @@ import numpy as np
 from pathlib import Path
 
 
-def print_h5_structure(h5_file, path='/', indent=0):
-    """Recursively print H5 file structure."""
-    prefix = "  " * indent
+def _attr_lines(obj, prefix):
+    lines = []
+    if obj.attrs:
+        for attr_name, attr_val in obj.attrs.items():
+            if isinstance(attr_val, bytes):
+                attr_val = attr_val.decode('utf-8', errors='replace')
+            lines.append(f"{prefix}  @{attr_name} = {attr_val}")
+    return lines
+
+
+def _preview_lines(obj, prefix, scratch):
+    """Sample values for a dataset (one small read each)."""
+    if obj.size < 10:
+        return [f"{prefix}  values: {obj[()]}"]
+    if obj.ndim == 1:
+        if obj.dtype.kind in 'biuf':
+            # Reuse one 3-element buffer per dtype for the head/tail reads
+            buf = scratch.setdefault(obj.dtype, np.empty(3, dtype=obj.dtype))
+            obj.read_direct(buf, np.s_[:3])
+            first = buf.copy()
+            obj.read_direct(buf, np.s_[-3:])
+            return [f"{prefix}  first 3: {first}", f"{prefix}  last 3: {buf}"]
+        return [f"{prefix}  first 3: {obj[:3]}", f"{prefix}  last 3: {obj[-3:]}"]
+    if obj.ndim == 2 and obj.shape[0] <= 3:
+        return [f"{prefix}  first col (3): {obj[:, :3]}"]
+    return []
+
+
+def print_h5_structure(h5_file, path='/', indent=0, preview=True):
+    """
+    Print H5 file structure.
     
-    obj = h5_file[path]
+    Walks the tree under path once with visititems (name order, like the
+    sorted recursion it replaces) and prints everything in one write.
+    Dataset values are previewed unless preview=False, in which case only
+    dtype/shape metadata is touched.
+    """
+    scratch = {}
+    lines = []
+    
+    def add(obj, obj_path, level):
+        prefix = "  " * level
+        if isinstance(obj, h5py.Group):
+            lines.append(f"{prefix}[GROUP] {obj_path}")
+            lines.extend(_attr_lines(obj, prefix))
+        elif isinstance(obj, h5py.Dataset):
+            lines.append(f"{prefix}[DATASET] {obj_path}")
+            lines.append(f"{prefix}  dtype: {obj.dtype}, shape: {obj.shape}")
+            if preview:
+                lines.extend(_preview_lines(obj, prefix, scratch))
     
+    obj = h5_file[path]
+    add(obj, path, indent)
     if isinstance(obj, h5py.Group):
-        print(f"{prefix}[GROUP] {path}")
-        
-        # Print attributes
-        if obj.attrs:
-            for attr_name, attr_val in obj.attrs.items():
-                if isinstance(attr_val, bytes):
-                    attr_val = attr_val.decode('utf-8', errors='replace')
-                print(f"{prefix}  @{attr_name} = {attr_val}")
-        
-        # Recurse into children
-        for key in sorted(obj.keys()):
-            child_path = f"{path}/{key}" if path != '/' else f"/{key}"
-            print_h5_structure(h5_file, child_path, indent + 1)
-    
-    elif isinstance(obj, h5py.Dataset):
-        dtype = obj.dtype
-        shape = obj.shape
-        print(f"{prefix}[DATASET] {path}")
-        print(f"{prefix}  dtype: {dtype}, shape: {shape}")
-        
-        # Show sample values for small arrays
-        if obj.size < 10:
-            print(f"{prefix}  values: {obj[:]}")
-        elif obj.ndim == 1:
-            print(f"{prefix}  first 3: {obj[:3]}")
-            print(f"{prefix}  last 3: {obj[-3:]}")
-        elif obj.ndim == 2 and obj.shape[0] <= 3:
-            print(f"{prefix}  first col (3): {obj[:, :3]}")
+        base = path.rstrip('/')
+        obj.visititems(lambda name, child: add(child, f"{base}/{name}",
+                                               indent + name.count('/') + 1))
+    print("\n".join(lines))
 
 
 def check_expected_fields(h5_file):
@@ -88,10 +111,11 @@ def check_expected_fields(h5_file):
         if path in h5_file:
             found[path] = desc
         else:
-            # Check if it's an attribute instead
-            parent = '/'.join(path.split('/')[:-1]) or '/'
-            attr_name = path.split('/')[-1]
-            if parent in h5_file and attr_name in h5_file[parent].attrs:
+            # Check if it's an attribute instead (one lookup for the parent)
+            parent, _, attr_name = path.rpartition('/')
+            parent = parent or '/'
+            parent_obj = h5_file.get(parent)
+            if parent_obj is not None and attr_name in parent_obj.attrs:
                 found[f"{parent}@{attr_name}"] = f"{desc} (as attribute)"
             else:
                 missing[path] = desc
@@ -160,9 +184,8 @@ def check_track_structure(h5_file):
         
         print("\nTrack field check:")
         for field, expected_shape in track_expected.items():
-            full_path = f"/tracks/{first_key}/{field}"
-            if full_path in h5_file:
-                obj = h5_file[full_path]
+            obj = track.get(field)
+            if obj is not None:
                 if isinstance(obj, h5py.Dataset):
                     print(f"  [OK] {field}: shape={obj.shape}, dtype={obj.dtype}")
                 else:
@@ -172,6 +195,12 @@ def check_track_structure(h5_file):
 
 
 def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Inspect H5 file structure for field naming alignment')
+    parser.add_argument('--no-preview', action='store_true',
+                        help='List structure only, without reading sample values')
+    args = parser.parse_args()
+    
     # Configuration
     h5_dir = Path(r"D:\rawdata\GMR61@GMR61\T_Re_Sq_50to250PWM_30#C_Bl_7PWM\h5_exports")
     experiment_name = "GMR61@GMR61_T_Re_Sq_50to250PWM_30#C_Bl_7PWM_202506251614"
@@ -195,7 +224,7 @@ def main():
         print("=" * 70)
         print("FULL H5 STRUCTURE")
         print("=" * 70 + "\n")
-        print_h5_structure(f)
+        print_h5_structure(f, preview=not args.no_preview)
         
         # Check expected fields
         found, missing = check_expected_fields(f)
@@ -208,11 +237,12 @@ def main():
         print("GLOBAL QUANTITIES DETAIL")
         print("=" * 70 + "\n")
         
-        if '/global_quantities' in f:
-            gq = f['/global_quantities']
-            print(f"Keys: {list(gq.keys())}")
-            for key in gq.keys():
-                obj = gq[key]
+        gq = f.get('/global_quantities')
+        if gq is not None:
+            # Children are opened from the group handle, once each
+            items = list(gq.items())
+            print(f"Keys: {[key for key, _ in items]}")
+            for key, obj in items:
                 if isinstance(obj, h5py.Dataset):
                     print(f"  {key}: shape={obj.shape}, dtype={obj.dtype}")
         else:
@@ -385,9 +385,16 @@ def main():
     
     # Save SpeedRunVel as CSV for comparison
     csv_output = output_dir / "python_speedrunvel.csv"
-    np.savetxt(csv_output, np.column_stack([times_srv, speedrunvel]), delimiter=',')
+    srv_table = np.column_stack([times_srv, speedrunvel])
+    np.savetxt(csv_output, srv_table, delimiter=',')
     print(f"Saved SpeedRunVel CSV to: {csv_output}")
     
+    # Binary sidecar: compare_outputs memory-maps this instead of parsing the
+    # CSV (Fortran order keeps the time and SpeedRunVel columns contiguous)
+    npy_output = csv_output.with_suffix('.npy')
+    np.save(npy_output, np.asfortranarray(srv_table))
+    print(f"Saved SpeedRunVel NPY to: {npy_output}")
+    
     # Save ALL data as NPZ for detailed validation comparison with MATLAB
     npz_output = output_dir / "python_validation_full.npz"
     np.savez(
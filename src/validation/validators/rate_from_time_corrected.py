@@ -29,15 +29,49 @@ Rate = counts / bin_size (events per second)
 MATLAB equivalent: src/validation/reference/rate_from_time_corrected.m
 """
 
+from functools import lru_cache
+
 import numpy as np
 from typing import Tuple
 
 
+@lru_cache(maxsize=32)
+def _bin_edges(total_duration: float, bin_size: float) -> np.ndarray:
+    """
+    Edges i * bin_size of the non-overlapping bins, for i = 0..n_bins.
+    
+    Cached because sweeps call rate_from_time_corrected per track with the
+    same few (duration, bin size) pairs; the array is shared, so it is
+    returned read-only.
+    """
+    # Same bin count as np.arange(0, total_duration + bin_size, bin_size)
+    n_bins = int(np.ceil((total_duration + bin_size) / bin_size)) - 1
+    edges = np.arange(max(n_bins, 0) + 1) * bin_size
+    edges.flags.writeable = False
+    return edges
+
+
+@lru_cache(maxsize=32)
+def _empty_rate(n_bins: int, bin_size: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (rate, time_bins, counts) for a track with no events, shared by every
+    such call with the same bins; the arrays are read-only, so callers
+    hand out copies.
+    """
+    counts = np.zeros(n_bins, dtype=np.intp)
+    rate = np.zeros(n_bins)
+    time_bins = np.arange(n_bins) * bin_size + bin_size / 2
+    for arr in (rate, time_bins, counts):
+        arr.flags.writeable = False
+    return rate, time_bins, counts
+
+
 def rate_from_time_corrected(
     event_times: np.ndarray,
     total_duration: float,
     bin_size: float,
-    normalize_by_time: bool = True
+    normalize_by_time: bool = True,
+    presorted: bool = False
 ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
     Compute event rate using non-overlapping bins.
@@ -47,6 +81,9 @@ def rate_from_time_corrected(
         total_duration: Total observation duration (seconds)
         bin_size: Size of each time bin (seconds)
         normalize_by_time: If True, rate is per second; if False, raw count
+        presorted: event_times is already in ascending order (e.g. event
+            times from detect_reversals / detect_turn_events); counts come
+            from one searchsorted over the bin edges instead of a histogram
     
     Returns:
         rate: Event rate per bin (events/second if normalized)
@@ -60,20 +97,42 @@ def rate_from_time_corrected(
         # counts = [1, 2, 0, 1, 0] (events in each 2-second bin)
         # rate = counts / 2 = [0.5, 1, 0, 0.5, 0] events/second
     """
-    event_times = np.asarray(event_times).ravel()
+    # 1-D float64 arrays (what the detectors produce) are used as-is
+    if not (isinstance(event_times, np.ndarray) and event_times.ndim == 1
+            and event_times.dtype == np.float64):
+        event_times = np.asarray(event_times, dtype=np.float64).ravel()
     
-    # Create non-overlapping bins
-    bin_edges = np.arange(0, total_duration + bin_size, bin_size)
-    n_bins = len(bin_edges) - 1
+    # Non-overlapping bins [0, s), [s, 2s), ...
+    edges = _bin_edges(float(total_duration), float(bin_size))
+    n_bins = edges.size - 1
     
     if n_bins < 1:
         return np.array([]), np.array([]), np.array([])
     
-    # Compute bin centers
-    time_bins = bin_edges[:-1] + bin_size / 2
-    
-    # Count events in each bin
-    counts, _ = np.histogram(event_times, bins=bin_edges)
+    # Tracks without events (common in sweeps) all get the same zeros;
+    # copying the cached arrays keeps them writable like any other result
+    if event_times.size == 0:
+        rate, time_bins, counts = _empty_rate(n_bins, float(bin_size))
+        return rate.copy(), time_bins.copy(), counts.copy()
+    
+    # Compute bin centers (edge i is i * bin_size)
+    time_bins = np.arange(n_bins) * bin_size + bin_size / 2
+    
+    # Count events in each bin. With an integer bin count np.histogram bins
+    # arithmetically in one pass instead of a searchsorted per event; its
+    # internal edges are i * (hi / n_bins), so that path is only taken when
+    # they are bit-identical to i * bin_size
+    hi = n_bins * bin_size
+    if presorted:
+        # Bins are [edge, next edge) except the last, which includes its
+        # right edge, matching np.histogram
+        idx = np.searchsorted(event_times, edges, side='left')
+        idx[-1] = np.searchsorted(event_times, edges[-1], side='right')
+        counts = np.diff(idx)
+    elif hi / n_bins == bin_size:
+        counts, _ = np.histogram(event_times, bins=n_bins, range=(0.0, hi))
+    else:
+        counts, _ = np.histogram(event_times, bins=edges)
     
     # Compute rate
     if normalize_by_time:
@@ -96,16 +155,20 @@ def compare_with_original():
     stepsize = 0.1
     binsize = 0.5
     
-    # Compute using original method (emulated)
+    # Compute using original method (emulated), all windows at once: with
+    # sorted times, searchsorted gives how many events lie below each edge
     m = int(T / stepsize)
-    r_original = np.zeros(m + 1)
-    for j in range(m + 1):
-        tleft = (j * stepsize - binsize) % T
-        tright = (j * stepsize) % T
-        if tleft > tright:
-            r_original[j] = np.sum((event_times >= tleft) | (event_times < tright)) / binsize
-        else:
-            r_original[j] = np.sum((event_times >= tleft) & (event_times < tright)) / binsize
+    j = np.arange(m + 1)
+    tleft = (j * stepsize - binsize) % T
+    tright = (j * stepsize) % T
+    sorted_t = np.sort(event_times)
+    below_left = np.searchsorted(sorted_t, tleft)
+    below_right = np.searchsorted(sorted_t, tright)
+    # Windows wrapping past T (tleft > tright) count t >= tleft | t < tright
+    in_window = np.where(tleft > tright,
+                         len(sorted_t) - below_left + below_right,
+                         below_right - below_left)
+    r_original = in_window / binsize
     
     # Compute using corrected method
     r_corrected, time_bins, counts = rate_from_time_corrected(event_times, T, 1.0)
@@ -173,6 +236,14 @@ def test_rate_from_time_corrected():
     assert np.all(counts == 2), 'Test 5 failed: each 2s bin should have 2 events'
     print('Test 5 passed: different bin sizes')
     
+    # Test case 6: No events gives zeros that callers can modify in place
+    rate, bins, counts = rate_from_time_corrected(np.array([]), 4, 2.0)
+    assert np.all(counts == 0) and np.all(rate == 0), 'Test 6 failed: should be all zeros'
+    counts += 1
+    rate, bins, counts = rate_from_time_corrected(np.array([]), 4, 2.0)
+    assert np.all(counts == 0), 'Test 6 failed: cached zeros were modified'
+    print('Test 6 passed: no events')
+    
     print('\nAll tests passed for rate_from_time_corrected!')
 
 
@@ -8,8 +8,10 @@ Usage:
     python run_full_validation.py [--base-dir D:\rawdata\GMR61@GMR61]
 """
 
+import os
 import sys
 import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 from typing import List, Dict, Tuple
@@ -18,87 +20,165 @@ from typing import List, Dict, Tuple
 sys.path.insert(0, str(Path(__file__).parent))
 
 from validate_h5_schema import validate_h5_schema, print_results
+from validation_cache import CACHE_DIR, cache_key, load_cache, save_cache
+
+
+# Schema results from earlier runs, keyed by path + mtime + size, so re-runs
+# only revalidate files that changed. Bump CACHE_VERSION when
+# validate_h5_schema's checks change.
+CACHE_PATH = CACHE_DIR / '.validation_cache.json'
+CACHE_VERSION = 1
+
+# Threads listing eset directories in find_all_h5_files
+SCAN_WORKERS = 8
+
+# Per-file results, one JSON record per line, written as each file is
+# reported so an interrupted batch keeps its progress. Used when neither
+# --ndjson nor --output is given; otherwise it sits next to --output
+NDJSON_PATH = Path(__file__).parent / 'validation_results.ndjson'
+
+
+def _scan_eset(eset_dir: Path) -> List[Tuple[str, Path, Path]]:
+    """(eset_name, h5_path, mat_path) for every H5 export of one eset."""
+    h5_dir = eset_dir / "h5_exports"
+    mat_dir = eset_dir / "matfiles"
+    
+    try:
+        with os.scandir(h5_dir) as it:
+            # normcase keeps glob's case-insensitive match on Windows
+            h5_files = sorted(h5_dir / e.name for e in it if os.path.normcase(e.name).endswith('.h5'))
+    except OSError:  # no h5_exports directory
+        return []
+    
+    # Find corresponding MAT file
+    return [(eset_dir.name, h5_file, mat_dir / f"{h5_file.stem}.mat") for h5_file in h5_files]
 
 
 def find_all_h5_files(base_dir: Path) -> List[Tuple[str, Path, Path]]:
     """
     Find all H5 files and their corresponding MAT files.
     
+    Esets are listed with os.scandir (no per-entry stat on Windows) and
+    scanned concurrently, which helps most on network storage.
+    
     Returns:
         List of (eset_name, h5_path, mat_path) tuples
     """
-    results = []
+    with os.scandir(base_dir) as it:
+        eset_dirs = sorted(base_dir / e.name for e in it if e.is_dir())
     
-    for eset_dir in sorted(base_dir.iterdir()):
-        if not eset_dir.is_dir():
-            continue
-        
-        h5_dir = eset_dir / "h5_exports"
-        mat_dir = eset_dir / "matfiles"
-        
-        if not h5_dir.exists():
-            continue
-        
-        for h5_file in sorted(h5_dir.glob("*.h5")):
-            # Find corresponding MAT file
-            mat_file = mat_dir / f"{h5_file.stem}.mat"
-            results.append((eset_dir.name, h5_file, mat_file))
+    results = []
+    with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as ex:
+        for eset_files in ex.map(_scan_eset, eset_dirs):
+            results.extend(eset_files)
     
     return results
 
 
-def run_schema_validation(h5_files: List[Tuple[str, Path, Path]], verbose: bool = False) -> Dict:
+def _validate_one(eset_name: str, h5_path: Path, mat_path: Path) -> Dict:
+    """Process-pool worker: validate one H5 file into a plain (pickleable) dict."""
+    passed, validation_results = validate_h5_schema(h5_path)
+    
+    errors = [r for r in validation_results if r.severity == 'error' and not r.passed]
+    warnings = [r for r in validation_results if r.severity == 'warning' and not r.passed]
+    
+    return {
+        'eset': eset_name,
+        'h5_file': str(h5_path),
+        'mat_file': str(mat_path),
+        'mat_exists': mat_path.exists(),
+        'passed': passed,
+        'errors': [r.message for r in errors],
+        'warnings': [r.message for r in warnings]
+    }
+
+
+def run_schema_validation(h5_files: List[Tuple[str, Path, Path]], verbose: bool = False,
+                          use_cache: bool = True, ndjson_path: Path = NDJSON_PATH) -> Dict:
     """
     Run schema validation on all H5 files.
     
+    Files are independent and h5py serializes calls within a process, so
+    they are validated in a process pool; results are reported in input
+    order as they come back. With use_cache, files unchanged since an
+    earlier run (same path, mtime and size) reuse its result.
+    
+    Each file's result is appended to ndjson_path as soon as it is
+    reported; only counts and a short summary of failures stay in memory.
+    
     Returns:
-        Dict with validation results
+        Dict with validation counts, failed-file summaries and the path of
+        the per-file records
     """
     results = {
         'timestamp': datetime.now().isoformat(),
         'total': len(h5_files),
         'passed': 0,
         'failed': 0,
-        'files': []
+        'failed_files': [],
+        'ndjson': str(ndjson_path)
     }
     
     print("=" * 70)
     print("SCHEMA VALIDATION - All H5 Files")
     print("=" * 70)
     
-    for eset_name, h5_path, mat_path in h5_files:
-        print(f"\n[{eset_name}] {h5_path.name}")
-        
-        passed, validation_results = validate_h5_schema(h5_path)
-        
-        errors = [r for r in validation_results if r.severity == 'error' and not r.passed]
-        warnings = [r for r in validation_results if r.severity == 'warning' and not r.passed]
-        
-        file_result = {
-            'eset': eset_name,
-            'h5_file': str(h5_path),
-            'mat_file': str(mat_path),
-            'mat_exists': mat_path.exists(),
-            'passed': passed,
-            'errors': [r.message for r in errors],
-            'warnings': [r.message for r in warnings]
-        }
-        
-        results['files'].append(file_result)
-        
-        if passed:
-            results['passed'] += 1
-            print(f"  [OK] PASSED")
-        else:
-            results['failed'] += 1
-            print(f"  [FAIL] FAILED ({len(errors)} errors)")
-            for err in errors[:3]:  # Show first 3 errors
-                print(f"    - {err.message}")
-            if len(errors) > 3:
-                print(f"    ... and {len(errors) - 3} more errors")
-        
-        if warnings and verbose:
-            print(f"  [WARN] {len(warnings)} warnings")
+    cache = load_cache(CACHE_PATH, CACHE_VERSION) if use_cache else {}
+    keys = [cache_key(h5_path) for _, h5_path, _ in h5_files]
+    to_validate = [entry for entry, key in zip(h5_files, keys) if key not in cache]
+    if cache:
+        print(f"Validation cache: {len(h5_files) - len(to_validate)} unchanged, "
+              f"{len(to_validate)} to check")
+    
+    workers = max(1, min(os.cpu_count() or 1, len(to_validate)))
+    with ProcessPoolExecutor(max_workers=workers) as ex, open(ndjson_path, 'w') as records:
+        fresh = ex.map(_validate_one, *zip(*to_validate)) if to_validate else iter([])
+        for (eset_name, h5_path, mat_path), key in zip(h5_files, keys):
+            cached = cache.get(key)
+            if cached is not None:
+                # The MAT file is not part of the key, so look it up again
+                file_result = {
+                    'eset': eset_name,
+                    'h5_file': str(h5_path),
+                    'mat_file': str(mat_path),
+                    'mat_exists': mat_path.exists(),
+                    'passed': cached['passed'],
+                    'errors': cached['errors'],
+                    'warnings': cached['warnings']
+                }
+            else:
+                file_result = next(fresh)
+                cache[key] = {k: file_result[k] for k in ('passed', 'errors', 'warnings')}
+            
+            print(f"\n[{file_result['eset']}] {Path(file_result['h5_file']).name}")
+            
+            errors = file_result['errors']
+            warnings = file_result['warnings']
+            
+            records.write(json.dumps(file_result) + "\n")
+            records.flush()
+            
+            if file_result['passed']:
+                results['passed'] += 1
+                print(f"  [OK] PASSED")
+            else:
+                results['failed'] += 1
+                results['failed_files'].append({
+                    'eset': file_result['eset'],
+                    'h5_file': file_result['h5_file'],
+                    'errors': errors[:2]
+                })
+                print(f"  [FAIL] FAILED ({len(errors)} errors)")
+                for err in errors[:3]:  # Show first 3 errors
+                    print(f"    - {err}")
+                if len(errors) > 3:
+                    print(f"    ... and {len(errors) - 3} more errors")
+            
+            if warnings and verbose:
+                print(f"  [WARN] {len(warnings)} warnings")
+    
+    if use_cache:
+        save_cache(CACHE_PATH, CACHE_VERSION, {key: cache[key] for key in keys})
     
     return results
 
@@ -114,11 +194,10 @@ def print_summary(results: Dict):
     
     if results['failed'] > 0:
         print("\nFailed files:")
-        for f in results['files']:
-            if not f['passed']:
-                print(f"  [FAIL] {f['eset']}/{Path(f['h5_file']).name}")
-                for err in f['errors'][:2]:
-                    print(f"      {err}")
+        for f in results['failed_files']:
+            print(f"  [FAIL] {f['eset']}/{Path(f['h5_file']).name}")
+            for err in f['errors']:
+                print(f"      {err}")
     
     print("\n" + "=" * 70)
     if results['failed'] == 0:
@@ -128,6 +207,27 @@ def print_summary(results: Dict):
     print("=" * 70)
 
 
+def write_results_json(output_path: Path, results: Dict):
+    """
+    Write the consolidated results JSON (counts plus every per-file record).
+    
+    Records are copied from the NDJSON file one line at a time, formatted
+    as json.dump(..., indent=2) would, so the whole batch is never held in
+    memory.
+    """
+    with open(output_path, 'w') as out, open(results['ndjson']) as records:
+        out.write("{\n")
+        for key in ('timestamp', 'total', 'passed', 'failed'):
+            out.write(f'  {json.dumps(key)}: {json.dumps(results[key])},\n')
+        out.write('  "files": [')
+        first = True
+        for line in records:
+            record = json.dumps(json.loads(line), indent=2).replace("\n", "\n    ")
+            out.write(("\n    " if first else ",\n    ") + record)
+            first = False
+        out.write("]\n}" if first else "\n  ]\n}")
+
+
 def main():
     import argparse
     
@@ -140,6 +240,12 @@ def main():
                        help='Show verbose output including warnings')
     parser.add_argument('--output', type=str,
                        help='Save results to JSON file')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Revalidate every file, ignoring cached results from earlier runs')
+    parser.add_argument('--ndjson', type=str,
+                       help='Stream per-file results to this NDJSON file '
+                            '(default: --output with a .ndjson suffix, else '
+                            'validation_results.ndjson next to this script)')
     
     args = parser.parse_args()
     
@@ -157,8 +263,17 @@ def main():
     
     print(f"Found {len(h5_files)} H5 files across {len(set(f[0] for f in h5_files))} esets\n")
     
+    if args.ndjson:
+        ndjson_path = Path(args.ndjson)
+    elif args.output:
+        ndjson_path = Path(args.output).with_suffix('.ndjson')
+    else:
+        ndjson_path = NDJSON_PATH
+    
     # Run validation
-    results = run_schema_validation(h5_files, args.verbose)
+    results = run_schema_validation(h5_files, args.verbose, use_cache=not args.no_cache,
+                                    ndjson_path=ndjson_path)
+    print(f"Per-file records: {ndjson_path}")
     
     # Print summary
     print_summary(results)
@@ -166,14 +281,12 @@ def main():
     # Save results if requested
     if args.output:
         output_path = Path(args.output)
-        with open(output_path, 'w') as f:
-            json.dump(results, f, indent=2)
+        write_results_json(output_path, results)
         print(f"\nResults saved to: {output_path}")
     
     # Save to default location
     default_output = Path(__file__).parent / 'validation_results.json'
-    with open(default_output, 'w') as f:
-        json.dump(results, f, indent=2)
+    write_results_json(default_output, results)
     print(f"Results saved to: {default_output}")
     
     return 0 if results['failed'] == 0 else 1
@@ -11,7 +11,10 @@ Usage:
     python validate_camcal.py --batch --base-dir D:\rawdata\GMR61@GMR61
 """
 
+import atexit
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import h5py
 from pathlib import Path
@@ -19,6 +22,58 @@ from typing import Dict, Tuple, List, Optional
 from dataclasses import dataclass
 
 
+# MATLAB code paths the camcal extraction needs
+MATLAB_SCRIPTS_DIR = r"D:\mechanosensation\scripts\2025-10-16"
+MATLAB_TRACK_ANALYSIS_DIR = r"d:\magniphyq\codebase\Matlab-Track-Analysis-SkanataLab"
+
+# Holds extract_camcal.m, the single-call MATLAB side of the comparison
+REFERENCE_DIR = Path(__file__).resolve().parent.parent / 'reference'
+
+# camcalinfo point arrays compared against the H5 export
+CAMCAL_ARRAY_FIELDS = ['realx', 'realy', 'camx', 'camy']
+
+# Shared MATLAB engine, started on first use (see _get_engine)
+_ENGINE = None
+
+# MATLAB engines batch_validate runs side by side (each is a separate
+# MATLAB process, so this is bounded by RAM and licenses)
+MATLAB_ENGINE_WORKERS = 4
+
+
+def _get_engine():
+    """
+    Return the module's MATLAB engine, starting it (with paths added) on
+    first use. Engine startup takes seconds, so every load_camcal_from_mat
+    call and batch_validate share one; it is shut down at interpreter exit.
+    """
+    global _ENGINE
+    if _ENGINE is None:
+        _ENGINE = _start_engine()
+    return _ENGINE
+
+
+def _start_engine():
+    """Start a MATLAB engine with the camcal code paths added."""
+    import matlab.engine
+    
+    eng = matlab.engine.start_matlab()
+    eng.addpath(MATLAB_SCRIPTS_DIR, nargout=0)
+    eng.addpath(eng.genpath(MATLAB_TRACK_ANALYSIS_DIR), nargout=0)
+    eng.addpath(str(REFERENCE_DIR), nargout=0)
+    return eng
+
+
+@atexit.register
+def _quit_engine():
+    global _ENGINE
+    if _ENGINE is not None:
+        try:
+            _ENGINE.quit()
+        except Exception:
+            pass  # Engine already gone (e.g. MATLAB was closed)
+        _ENGINE = None
+
+
 @dataclass
 class ComparisonResult:
     """Result of comparing a single field."""
@@ -34,87 +89,50 @@ def load_camcal_from_h5(h5_path: Path) -> Dict[str, np.ndarray]:
     """Load camera calibration data from H5 file."""
     result = {}
     
+    # Plain read mode, not swmr=True: SWMR needs the v3 superblock, and
+    # only files exported since convert_matlab_to_h5 switched to
+    # libver='latest' have it; older exports must still open here
     with h5py.File(str(h5_path), 'r') as f:
         # lengthPerPixel from root
-        if 'lengthPerPixel' in f:
-            result['lengthPerPixel'] = np.array([f['lengthPerPixel'][()]])
+        lpp = f.get('lengthPerPixel')
+        if lpp is not None:
+            result['lengthPerPixel'] = np.array([lpp[()]])
         
-        # camcalinfo group
-        if 'camcalinfo' in f:
-            cc = f['camcalinfo']
-            for key in cc.keys():
-                if isinstance(cc[key], h5py.Dataset):
-                    result[key] = cc[key][:]
+        # camcalinfo group; items() opens each child once, and [()] reads
+        # scalar datasets as well as arrays
+        cc = f.get('camcalinfo')
+        if cc is not None:
+            for key, obj in cc.items():
+                if isinstance(obj, h5py.Dataset):
+                    result[key] = obj[()]
     
     return result
 
 
+def _camcal_from_struct(out: Dict) -> Dict[str, np.ndarray]:
+    """
+    Convert extract_camcal's output struct (a dict of MATLAB arrays) to the
+    numpy layout compare_camcal expects.
+    """
+    result = {}
+    for field in CAMCAL_ARRAY_FIELDS:
+        if out.get(field) is not None:
+            result[field] = np.array(out[field]).flatten()
+    result['lengthPerPixel'] = np.array([float(out['lengthPerPixel'])])
+    if 'tri_connectivity' in out:
+        result['tri_points'] = np.array(out['tri_points'])
+        result['tri_connectivity'] = np.array(out['tri_connectivity']).astype(np.int32) - 1  # 0-based
+    return result
+
+
 def load_camcal_from_mat(mat_path: Path) -> Dict[str, np.ndarray]:
     """Load camera calibration data from MATLAB .mat file using MATLAB engine."""
-    import matlab.engine
-    
-    eng = matlab.engine.start_matlab()
+    # One engine call: extract_camcal.m loads the file and computes every
+    # field, in its own function workspace
+    out = _get_engine().extract_camcal(str(mat_path), nargout=1)
     
-    try:
-        # Add paths
-        eng.addpath(r"D:\mechanosensation\scripts\2025-10-16", nargout=0)
-        eng.addpath(eng.genpath(r"d:\magniphyq\codebase\Matlab-Track-Analysis-SkanataLab"), nargout=0)
-        
-        # Load experiment
-        eng.eval(f"load('{str(mat_path)}')", nargout=0)
-        
-        # Handle variable naming
-        eng.eval("""
-            if exist('experiment', 'var')
-                eset = ExperimentSet();
-                eset.expt = experiment;
-                clear experiment;
-            end
-        """, nargout=0)
-        
-        result = {}
-        
-        # Get camcalinfo
-        eng.eval("cc = eset.expt(1).camcalinfo;", nargout=0)
-        
-        # Extract arrays
-        for field in ['realx', 'realy', 'camx', 'camy']:
-            try:
-                eng.eval(f"arr = cc.{field};", nargout=0)
-                val = eng.workspace['arr']
-                if val is not None:
-                    result[field] = np.array(val).flatten()
-            except:
-                pass
-        
-        # Compute lengthPerPixel
-        lpp_code = """
-            test_pixels_x = [100, 500];
-            test_pixels_y = [100, 500];
-            real_coords_x = cc.c2rX(test_pixels_x, test_pixels_y);
-            real_coords_y = cc.c2rY(test_pixels_x, test_pixels_y);
-            pixel_dist = sqrt((test_pixels_x(2) - test_pixels_x(1))^2 + (test_pixels_y(2) - test_pixels_y(1))^2);
-            real_dist = sqrt((real_coords_x(2) - real_coords_x(1))^2 + (real_coords_y(2) - real_coords_y(1))^2);
-            lengthPerPixel = real_dist / pixel_dist;
-        """
-        eng.eval(lpp_code, nargout=0)
-        result['lengthPerPixel'] = np.array([float(eng.workspace['lengthPerPixel'])])
-        
-        # Compute triangulation
-        try:
-            eng.eval("""
-                tri_connectivity = delaunay(cc.camx, cc.camy);
-                tri_points = [cc.camx(:), cc.camy(:)];
-            """, nargout=0)
-            result['tri_points'] = np.array(eng.workspace['tri_points'])
-            result['tri_connectivity'] = np.array(eng.workspace['tri_connectivity']).astype(np.int32) - 1  # 0-based
-        except:
-            pass
-        
-        return result
-        
-    finally:
-        eng.quit()
+    # Triangulation is optional here (out.tri_error is set instead)
+    return _camcal_from_struct(out)
 
 
 def compare_camcal(h5_data: Dict, mat_data: Dict, tolerance: float = 1e-10) -> List[ComparisonResult]:
@@ -161,9 +179,10 @@ def compare_camcal(h5_data: Dict, mat_data: Dict, tolerance: float = 1e-10) -> L
             ))
             continue
         
-        # Both present - compare
-        h5_flat = np.array(h5_val).flatten()
-        mat_flat = np.array(mat_val).flatten()
+        # Both present - compare. asarray/ravel return views for the
+        # contiguous ndarrays both loaders produce, so nothing is copied
+        h5_flat = np.asarray(h5_val).ravel()
+        mat_flat = np.asarray(mat_val).ravel()
         
         if h5_flat.shape != mat_flat.shape:
             results.append(ComparisonResult(
@@ -176,8 +195,10 @@ def compare_camcal(h5_data: Dict, mat_data: Dict, tolerance: float = 1e-10) -> L
             ))
             continue
         
-        # Compute difference
-        max_diff = np.max(np.abs(h5_flat - mat_flat))
+        # Compute difference (needed for the message either way); the
+        # subtraction's buffer is reused for the abs
+        diff = np.subtract(h5_flat, mat_flat)
+        max_diff = np.max(np.abs(diff, out=diff))
         match = max_diff <= tolerance
         
         if match:
@@ -234,10 +255,19 @@ def print_results(results: List[ComparisonResult], verbose: bool = False):
                 print(f"      {r.message}")
 
 
-def batch_validate(base_dir: Path) -> Dict:
-    """Validate all experiments in base directory."""
-    import matlab.engine
-    
+def _extract_camcal_batch(eng, mat_path: Path) -> Dict[str, np.ndarray]:
+    """
+    batch_validate's MATLAB side for one file, on the given engine (one
+    extract_camcal call). Raises if any step fails, triangulation included.
+    """
+    out = eng.extract_camcal(str(mat_path), nargout=1)
+    if 'tri_error' in out:
+        raise RuntimeError(out['tri_error'])
+    return _camcal_from_struct(out)
+
+
+def batch_validate(base_dir: Path, n_engines: int = MATLAB_ENGINE_WORKERS) -> Dict:
+    """Validate all experiments in base directory, n_engines files at a time."""
     print("=" * 70)
     print("CAMERA CALIBRATION VALIDATION")
     print("Comparing H5 exports against MATLAB source files")
@@ -262,11 +292,26 @@ def batch_validate(base_dir: Path) -> Dict:
     
     print(f"Found {len(pairs)} H5/MAT pairs\n")
     
-    # Start single MATLAB engine for all comparisons
-    print("Starting MATLAB engine...")
-    eng = matlab.engine.start_matlab()
-    eng.addpath(r"D:\mechanosensation\scripts\2025-10-16", nargout=0)
-    eng.addpath(eng.genpath(r"d:\magniphyq\codebase\Matlab-Track-Analysis-SkanataLab"), nargout=0)
+    # A small pool of MATLAB engines, one per worker thread; each engine is
+    # a separate MATLAB process, so files are extracted concurrently
+    n_workers = max(1, min(n_engines, len(pairs)))
+    print(f"Starting {n_workers} MATLAB engine(s)...")
+    worker_state = threading.local()
+    engines = []
+    engines_lock = threading.Lock()
+    
+    def extract(pair):
+        _, h5_path, mat_path = pair
+        eng = getattr(worker_state, 'eng', None)
+        if eng is None:
+            eng = worker_state.eng = _start_engine()
+            with engines_lock:
+                engines.append(eng)
+        h5_data = load_camcal_from_h5(h5_path)
+        try:
+            return h5_data, _extract_camcal_batch(eng, mat_path), None
+        except Exception as e:
+            return h5_data, None, e
     
     results_summary = {
         'total': len(pairs),
@@ -276,87 +321,44 @@ def batch_validate(base_dir: Path) -> Dict:
     }
     
     try:
-        for eset_name, h5_path, mat_path in pairs:
-            print(f"\n[{eset_name}] {h5_path.name}")
-            
-            # Load H5 data
-            h5_data = load_camcal_from_h5(h5_path)
-            
-            # Load MATLAB data using shared engine
-            mat_data = {}
-            try:
-                eng.eval(f"load('{str(mat_path)}')", nargout=0)
-                eng.eval("""
-                    if exist('experiment', 'var')
-                        eset = ExperimentSet();
-                        eset.expt = experiment;
-                        clear experiment;
-                    end
-                    cc = eset.expt(1).camcalinfo;
-                """, nargout=0)
+        with ThreadPoolExecutor(max_workers=n_workers) as ex:
+            # Results come back in pair order, so the report reads as before
+            for (eset_name, h5_path, mat_path), (h5_data, mat_data, error) in zip(pairs, ex.map(extract, pairs)):
+                print(f"\n[{eset_name}] {h5_path.name}")
                 
-                for field in ['realx', 'realy', 'camx', 'camy']:
-                    try:
-                        eng.eval(f"arr = cc.{field};", nargout=0)
-                        val = eng.workspace['arr']
-                        if val is not None:
-                            mat_data[field] = np.array(val).flatten()
-                    except:
-                        pass
+                if error is not None:
+                    print(f"  ERROR loading MATLAB data: {error}")
+                    results_summary['failed'] += 1
+                    results_summary['files'].append({
+                        'eset': eset_name,
+                        'h5': str(h5_path),
+                        'mat': str(mat_path),
+                        'passed': False,
+                        'error': str(error)
+                    })
+                    continue
                 
-                # Compute lengthPerPixel
-                eng.eval("""
-                    test_pixels_x = [100, 500];
-                    test_pixels_y = [100, 500];
-                    real_coords_x = cc.c2rX(test_pixels_x, test_pixels_y);
-                    real_coords_y = cc.c2rY(test_pixels_x, test_pixels_y);
-                    pixel_dist = sqrt((test_pixels_x(2) - test_pixels_x(1))^2 + (test_pixels_y(2) - test_pixels_y(1))^2);
-                    real_dist = sqrt((real_coords_x(2) - real_coords_x(1))^2 + (real_coords_y(2) - real_coords_y(1))^2);
-                    lengthPerPixel = real_dist / pixel_dist;
-                """, nargout=0)
-                mat_data['lengthPerPixel'] = np.array([float(eng.workspace['lengthPerPixel'])])
+                # Compare
+                comparison = compare_camcal(h5_data, mat_data)
+                all_match = all(r.match for r in comparison)
                 
-                # Compute triangulation
-                eng.eval("""
-                    tri_connectivity = delaunay(cc.camx, cc.camy);
-                    tri_points = [cc.camx(:), cc.camy(:)];
-                """, nargout=0)
-                mat_data['tri_points'] = np.array(eng.workspace['tri_points'])
-                mat_data['tri_connectivity'] = np.array(eng.workspace['tri_connectivity']).astype(np.int32) - 1
+                print_results(comparison)
+                
+                if all_match:
+                    results_summary['passed'] += 1
+                else:
+                    results_summary['failed'] += 1
                 
-            except Exception as e:
-                print(f"  ERROR loading MATLAB data: {e}")
-                results_summary['failed'] += 1
                 results_summary['files'].append({
                     'eset': eset_name,
                     'h5': str(h5_path),
                     'mat': str(mat_path),
-                    'passed': False,
-                    'error': str(e)
+                    'passed': all_match,
+                    'comparisons': [{'field': r.field, 'match': r.match, 'message': r.message} for r in comparison]
                 })
-                continue
-            
-            # Compare
-            comparison = compare_camcal(h5_data, mat_data)
-            all_match = all(r.match for r in comparison)
-            
-            print_results(comparison)
-            
-            if all_match:
-                results_summary['passed'] += 1
-            else:
-                results_summary['failed'] += 1
-            
-            results_summary['files'].append({
-                'eset': eset_name,
-                'h5': str(h5_path),
-                'mat': str(mat_path),
-                'passed': all_match,
-                'comparisons': [{'field': r.field, 'match': r.match, 'message': r.message} for r in comparison]
-            })
-    
     finally:
-        eng.quit()
+        for eng in engines:
+            eng.quit()
     
     # Print summary
     print("\n" + "=" * 70)
@@ -386,12 +388,14 @@ def main():
     parser.add_argument('--batch', action='store_true', help='Batch validate all experiments')
     parser.add_argument('--base-dir', type=str, default=r'D:\rawdata\GMR61@GMR61',
                        help='Base directory for batch mode')
+    parser.add_argument('--engines', type=int, default=MATLAB_ENGINE_WORKERS,
+                       help='MATLAB engines to run in parallel in batch mode')
     parser.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
     
     args = parser.parse_args()
     
     if args.batch:
-        results = batch_validate(Path(args.base_dir))
+        results = batch_validate(Path(args.base_dir), args.engines)
         return 0 if results['failed'] == 0 else 1
     
     elif args.h5_file and args.mat_file:
@@ -0,0 +1,44 @@
+"""
+validation_cache.py - On-disk cache of per-file validation outcomes
+
+Shared by run_full_validation.py and batch_process_all_esets.py so re-runs
+only reopen H5 files that changed. Entries are keyed by resolved path,
+mtime and size; each caller keeps its own cache file and version, and
+bumps the version when the checks behind its cached outcomes change.
+
+The cache file is JSON: {"version": <int>, "files": {<key>: <entry>}}.
+"""
+
+import json
+from pathlib import Path
+from typing import Dict
+
+# Cache files live next to the validator scripts
+CACHE_DIR = Path(__file__).parent
+
+
+def cache_key(h5_path: Path) -> str:
+    """Key that changes whenever the file is rewritten (path + mtime + size)."""
+    st = h5_path.stat()
+    return f"{h5_path.resolve()}|{st.st_mtime_ns}|{st.st_size}"
+
+
+def load_cache(cache_path: Path, version: int) -> Dict:
+    """Load cached entries (empty if missing, unreadable or a different version)."""
+    try:
+        with open(cache_path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cache.get('version') != version:
+        return {}
+    return cache.get('files', {})
+
+
+def save_cache(cache_path: Path, version: int, entries: Dict):
+    """Write entries; a failed write only prints a warning."""
+    try:
+        with open(cache_path, 'w') as f:
+            json.dump({'version': version, 'files': entries}, f)
+    except OSError as e:
+        print(f"[WARNING] Could not write validation cache {cache_path}: {e}")